@@ -0,0 +1,172 @@
+"""
+Benchmarks for the network algorithms.
+
+Functions:
+bench_map_ac_workers: time map_ac for an increasing number of worker processes
+bench_multi_bfs: time batched (MS-BFS) centrality against one BFS per source
+bench_bridge_links: time bridge detection on chain and grid networks of growing size
+bench_heaps: time building and emptying the jbheap heaps against heapq
+bench_djikstra_queues: time Djikstra with each priority queue on factory networks
+"""
+import heapq
+import math
+import os
+import random
+import time
+
+import jbheap as jbh
+import jbnetwork as jbn
+import jbnetworkfactory as jbnf
+
+
+def _elapsed(func, *args, **kwargs):
+    """Return (wall-clock seconds, return value) of calling func."""
+    start = time.perf_counter()
+    rvalue = func(*args, **kwargs)
+    return (time.perf_counter() - start, rvalue)
+
+
+def bench_map_ac_workers(size=2000, prob=0.005, max_workers=None):
+    """
+    Time map_ac on a random network for 1, 2, 4, ... worker processes.
+
+    Print and return a list of (workers, seconds, speedup) tuples.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    network = jbnf.build_random_network(size, prob)
+    serial_time, serial_acmap = _elapsed(network.map_ac)
+
+    results = [(1, serial_time, 1.0)]
+    print('map_ac, {} nodes, {} links'.format(network.node_count, network.link_count))
+    print('workers: 1  time (s): {:.3f}  speedup: 1.00'.format(serial_time))
+
+    workers = 2
+    while workers <= max_workers:
+        par_time, acmap = _elapsed(network.map_ac, workers=workers)
+        assert acmap == serial_acmap
+        results.append((workers, par_time, serial_time / par_time))
+        print('workers: {}  time (s): {:.3f}  speedup: {:.2f}'.format(
+            workers, par_time, serial_time / par_time))
+        workers *= 2
+
+    return results
+
+
+def bench_multi_bfs(size=2000, prob=0.005):
+    """
+    Time map_ac (64 sources per search) against one BFS per source.
+
+    Print and return (per-source seconds, batched seconds).
+    """
+    network = jbnf.build_random_network(size, prob).compile()
+
+    def _per_source():
+        return {node: network.compute_node_centrality(node) for node in network.nodes}
+
+    single_time, single_acmap = _elapsed(_per_source)
+    batch_time, batch_acmap = _elapsed(network.map_ac)
+    assert batch_acmap == single_acmap
+    print('per-source BFS (s): {:.3f}  batched BFS (s): {:.3f}  speedup: {:.2f}'.format(
+        single_time, batch_time, single_time / batch_time))
+    return (single_time, batch_time)
+
+
+def bench_bridge_links(max_size=2**20, start_size=2**12):
+    """
+    Time RSTree construction and bridge detection on chain and grid networks.
+
+    The size doubles from start_size to max_size nodes. If the running time
+    is linear, the time per node stays about the same.
+
+    Print and return a list of (kind, nodes, seconds) tuples.
+    """
+    results = []
+    size = start_size
+    while size <= max_size:
+        side = int(math.sqrt(size))
+        for kind, network in [('chain', jbnf.build_chain_network(size)),
+                              ('grid', jbnf.build_grid_network((side, side)))]:
+            elapsed, _ = _elapsed(lambda: jbn.RSTree(network, 0).bridge_links)
+            results.append((kind, network.node_count, elapsed))
+            print('{:5}  nodes: {:8}  time (s): {:.3f}  us/node: {:.2f}'.format(
+                kind, network.node_count, elapsed, 1e6 * elapsed / network.node_count))
+        size *= 2
+    return results
+
+
+def bench_heaps(size=200000):
+    """
+    Time building a heap of size (value, payload) tuples, then popping
+    every element, for the jbheap heaps and plain heapq.
+
+    Print and return a list of (name, build seconds, pop seconds) tuples.
+    """
+    elements = [(random.random(), i) for i in range(size)]
+
+    def _heapq_build():
+        L = elements[:]
+        heapq.heapify(L)
+        return L
+
+    def _heapq_pop(L):
+        heappop = heapq.heappop
+        return [heappop(L) for _ in range(len(L))]
+
+    candidates = [
+        ('heapq', _heapq_build, _heapq_pop),
+        ('HeapOfTuples', lambda: jbh.HeapOfTuples(0, elements),
+         lambda heap: heap.pop_many(size)),
+        ('IndexedHeap', lambda: jbh.IndexedHeap(1, 0, elements),
+         lambda heap: heap.pop_many(size)),
+        ('KeyHeap', lambda: jbh.KeyHeap(lambda el: el[0], elements),
+         lambda heap: heap.pop_many(size)),
+        ('ArrayHeap', lambda: jbh.ArrayHeap(elements, payload_typecode='q'),
+         lambda heap: heap.pop_many(size)),
+    ]
+
+    results = []
+    for name, build, pop_all in candidates:
+        build_time, heap = _elapsed(build)
+        pop_time, popped = _elapsed(pop_all, heap)
+        assert len(popped) == size
+        results.append((name, build_time, pop_time))
+        print('{:12}  build (s): {:.3f}  pop all (s): {:.3f}'.format(name, build_time, pop_time))
+    return results
+
+
+def bench_djikstra_queues(sources=20):
+    """
+    Time Djikstra from a few sources with each priority queue (see
+    Network.map_weighted_distance_to_node) on random, grid and hypercube
+    networks with random link weights.
+
+    Print and return a list of (network, queue, seconds) tuples.
+    """
+    networks = [('random', jbnf.build_random_network(3000, 0.004)),
+                ('grid', jbnf.build_grid_network((60, 60))),
+                ('hypercube', jbnf.build_hypercube_network(2**12))]
+
+    results = []
+    for name, network in networks:
+        weighted = jbn.Network.from_edges(
+            ((node1, node2, random.randint(1, 100))
+             for node1 in network.nodes for node2 in network.find_neighbors(node1)
+             if node1 < node2),
+            weighted=True).compile()
+        nodes = weighted.nodes[:sources]
+        for queue in ('binary', 'd-ary', 'pairing'):
+            elapsed, _ = _elapsed(lambda: [weighted.map_weighted_distance_to_node(node, queue=queue)
+                                           for node in nodes])
+            results.append((name, queue, elapsed))
+            print('{:9}  queue: {:7}  time (s): {:.3f}'.format(name, queue, elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    bench_map_ac_workers()
+    bench_multi_bfs()
+    bench_bridge_links()
+    bench_heaps()
+    bench_djikstra_queues()
@@ -1,28 +1,52 @@
 """Functions to construct and compute properties of bipartite networks."""
-import csv
-
+import jbheap as jbh
 import jbnetwork as jbnet
+from jbnetwork import _shared_state, _worker_pool
 
 
-def build_bp_network_from_csv(csvfn, delim=','):
+def build_bp_network_from_csv(csvfn, delim=',', int_ids=False):
     """
     Build a bipartite network from a csv file.
-    """
-    net = jbnet.Network()
 
-    with open(csvfn, 'r') as csvf:
-        rdr = csv.reader(csvf, delimiter=delim)
+    The rows are streamed, and the two sides are collected into sets as
+    they are read, so memory grows with the number of nodes, not rows.
+    Node labels are interned.
 
-        nodes_left = []
-        nodes_right = []
-        for row in rdr:
-            node1 = row[0]
-            node2 = row[1]
-            net.add_link(node1, node2)
-            nodes_left.append(node1)
-            nodes_right.append(node2)
+    Arguments:
+    csvfn -- a file path, or a list of file paths (e.g. a data set split
+             in chunks); files ending in .gz are decompressed on the fly
+    delim -- field delimiter
+    int_ids -- if True, replace node labels with integer ids 0, 1, 2, ...
 
-    return (net, set(nodes_left), set(nodes_right))
+    Return (network, left_nodes, right_nodes), plus the list of labels
+    indexed by id if int_ids is True.
+    """
+    nodes_left = set()
+    nodes_right = set()
+    labels = []
+    ids = {}
+
+    def _node_id(label):
+        node_id = ids.get(label)
+        if node_id is None:
+            node_id = ids[label] = len(labels)
+            labels.append(label)
+        return node_id
+
+    def _links():
+        for node1, node2 in jbnet.read_edges(csvfn, delim=delim, comment=None):
+            if int_ids:
+                node1 = _node_id(node1)
+                node2 = _node_id(node2)
+            nodes_left.add(node1)
+            nodes_right.add(node2)
+            yield (node1, node2)
+
+    net = jbnet.Network.from_edges(_links())
+
+    if int_ids:
+        return (net, nodes_left, nodes_right, labels)
+    return (net, nodes_left, nodes_right)
 
 
 def map_bp_str_of_connection(net, inter_nodes):
@@ -52,6 +76,86 @@ def map_bp_str_of_connection(net, inter_nodes):
     return str_of_connection
 
 
+def _cooccurrence_rows(compiled, node_ids, max_degree=None):
+    """
+    Yield (node_id, {other_id: count}) for each node id, one row at a time.
+
+    count is the number of intermediary nodes linked to both nodes: row
+    node_id of the sparse product B^T.B, accumulated as in Gustavson's
+    algorithm. Intermediaries with more than max_degree links are skipped.
+    """
+    _, offsets, neighbors, _ = compiled.csr
+    for node_id in node_ids:
+        counts = {}
+        for inter_id in neighbors[offsets[node_id]:offsets[node_id+1]]:
+            start, end = offsets[inter_id], offsets[inter_id+1]
+            if max_degree is not None and end - start > max_degree:
+                continue
+            for other_id in neighbors[start:end]:
+                counts[other_id] = counts.get(other_id, 0) + 1
+        counts.pop(node_id, None)
+        yield node_id, counts
+
+
+def _top_k_counts(counts, k):
+    """
+    Return the k (key, count) items of counts with the highest counts, highest first.
+
+    Uses a bounded min-heap of size k, so only k items are kept.
+    """
+    heap = jbh.HeapOfTuples(1)
+    for item in counts.items():
+        if len(heap) < k:
+            heap.insert(item)
+        elif item[1] > heap.peek()[1]:
+            heap.pop()
+            heap.insert(item)
+    top = []
+    while len(heap) > 0:
+        top.append(heap.pop())
+    top.reverse()
+    return top
+
+
+def project_bp_network(net, nodes, max_degree=None, top_k=None, weight=None):
+    """
+    Project a bipartite network onto one of its sides.
+
+    Two nodes of nodes are linked in the projection if they share an
+    intermediary node, with the number of shared intermediaries (the
+    strength of connection of map_bp_str_of_connection) as weight. The
+    counts are accumulated one row at a time, so memory holds a single
+    row besides the result.
+
+    Arguments:
+    net -- bipartite Network (or CompiledNetwork)
+    nodes -- nodes of the side to project
+    max_degree -- (optional) ignore intermediaries with more links than this
+    top_k -- (optional) keep only the k strongest connections of each
+             node; a link is kept if it is among the top k of either end
+    weight -- (optional) function turning a count into a link weight
+
+    Return a weighted Network.
+    """
+    nodes = list(nodes)
+    compiled = net if isinstance(net, jbnet.CompiledNetwork) else net.compile()
+    ids = compiled.csr[0]
+    index = {node: i for i, node in enumerate(ids)}
+
+    def _links():
+        for node_id, counts in _cooccurrence_rows(compiled, [index[n] for n in nodes], max_degree):
+            items = counts.items()
+            if top_k is not None and len(counts) > top_k:
+                items = _top_k_counts(counts, top_k)
+            for other_id, count in items:
+                yield (ids[node_id], ids[other_id], count if weight is None else weight(count))
+
+    projection = jbnet.Network.from_edges(_links(), weighted=True)
+    for node in nodes:
+        projection.add_node(node)
+    return projection
+
+
 def map_bp_strongest_connections(str_of_connection):
     map_strongest = []
 
@@ -63,24 +167,105 @@ def map_bp_strongest_connections(str_of_connection):
     return map_strongest
 
 
-def find_diff_paths(network, nodes_to_check):
-    # Find # of nodes for which the shortest weighted path
-    # is not the same as the shortest path by number of hops
-    diffpaths = 0
+def map_bp_top_connections(net, nodes, k=1, max_degree=None):
+    """
+    Map the k strongest connections of each node, without building the projection.
+
+    The strength of connection is as in map_bp_str_of_connection. Counts
+    are accumulated one node at a time and only the top k are kept, so
+    memory is O(len(nodes) * k) plus one node's counts.
 
-    for node in nodes_to_check:
-        wt_dist_map = network.map_weighted_distance_to_node(node)
-        nonwt_dist_map = network.map_distance_to_node(node)
-        for linked_node in wt_dist_map:
-            hops = nonwt_dist_map[linked_node]
-            wt_hops = wt_dist_map[linked_node][1]
-            if wt_hops != hops:
-                if linked_node in nodes_to_check:
-                    diffpaths += 0.5
-                else:
-                    diffpaths += 1.0
+    Arguments:
+    net -- bipartite Network (or CompiledNetwork)
+    nodes -- nodes of the side to map
+    k -- number of connections to keep per node
+    max_degree -- (optional) ignore intermediaries with more links than this
 
-    return diffpaths
+    Return a map of format {node: [(other_node, strength), ...]}, strongest
+    first. With k=1 this holds the same connections as
+    map_bp_strongest_connections (up to ties).
+    """
+    compiled = net if isinstance(net, jbnet.CompiledNetwork) else net.compile()
+    ids = compiled.csr[0]
+    index = {node: i for i, node in enumerate(ids)}
+
+    top_connections = {}
+    for node_id, counts in _cooccurrence_rows(compiled, [index[n] for n in nodes], max_degree):
+        top_connections[ids[node_id]] = [(ids[other_id], count)
+                                         for other_id, count in _top_k_counts(counts, k)]
+    return top_connections
+
+
+def find_diff_paths(network, nodes_to_check, workers=None):
+    """
+    Count the paths whose shortest weighted route has a different number
+    of hops than the shortest route.
+
+    Every pair (n, m) with n in nodes_to_check is counted once; a pair with
+    both nodes in nodes_to_check is seen from both sides and counts 0.5
+    each time.
+
+    Hop counts are found 64 sources at a time by one multi-source BFS over
+    the compiled network, and weighted hop counts by Djikstra from each
+    source. Both only visit the sources' components, and a Network is
+    only compiled for those components.
+
+    Arguments:
+    network -- Network or CompiledNetwork
+    nodes_to_check -- source nodes
+    workers -- (optional) number of worker processes to split the sources across
+    """
+    nodes_to_check = list(nodes_to_check)
+    if isinstance(network, jbnet.CompiledNetwork):
+        compiled = network
+    else:
+        # Only the components of the sources are searched, so only they are compiled
+        compiled = network.compile_components(nodes_to_check)
+    index = {node: i for i, node in enumerate(compiled.csr[0])}
+    source_ids = [index[node] for node in nodes_to_check]
+    check_ids = set(source_ids)
+
+    if workers is not None and workers > 1 and len(source_ids) > 64:
+        return _diff_paths_parallel(compiled, source_ids, check_ids, workers)
+    return _diff_path_total(compiled, source_ids, check_ids)
+
+
+def _diff_path_total(compiled, source_ids, check_ids):
+    """Count (as find_diff_paths) the node ids reached by a different number
+    of hops along the shortest and the shortest weighted path."""
+    total = 0.0
+    for i in range(0, len(source_ids), 64):
+        batch = source_ids[i:i+64]
+        hop_maps = [{} for _ in batch]
+        for depth, node_id, mask in compiled.multi_bfs(batch):
+            while mask:
+                low = mask & -mask
+                hop_maps[low.bit_length() - 1][node_id] = depth
+                mask ^= low
+
+        for source, hop_map in zip(batch, hop_maps):
+            for node_id, (_, wt_hops) in compiled.djikstra_ids(source, lambda x,y: x+y).items():
+                if hop_map[node_id] != wt_hops:
+                    total += 0.5 if node_id in check_ids else 1.0
+    return total
+
+
+def _diff_path_chunk(source_ids):
+    compiled, check_ids = _shared_state()
+    return _diff_path_total(compiled, source_ids, check_ids)
+
+
+def _diff_paths_parallel(compiled, source_ids, check_ids, workers):
+    """
+    Run _diff_path_total on chunks of the sources in a pool of worker processes.
+
+    Chunks are whole multiples of 64 sources, so no BFS batch is split.
+    """
+    chunk_size = 64 * max(1, len(source_ids) // (workers * 4 * 64))
+    chunks = [source_ids[i:i+chunk_size] for i in range(0, len(source_ids), chunk_size)]
+
+    with _worker_pool(workers, (compiled, check_ids)) as pool:
+        return sum(pool.map(_diff_path_chunk, chunks))
 
 
 def test_diffpaths():
@@ -95,13 +280,30 @@ def test_diffpaths():
         ('e', 'f', 1),
         ('e', 'g', 1)]
 
-    test_net = jbn.Network()
+    test_net = jbnet.Network()
 
     for edge in edges:
         test_net.add_link(edge[0], edge[1], weight=edge[2])
 
     diffpaths = find_diff_paths(test_net, ('a', 'b', 'c'))
     assert diffpaths == 7.0
+    assert find_diff_paths(test_net.compile(), ['a', 'b', 'c']) == 7.0
+
+    chain = jbnet.Network()
+    for i in range(199):
+        chain.add_link(i, i+1, weight=1)
+    chain.add_link(0, 199, weight=1000)
+    serial = find_diff_paths(chain, range(0, 200, 2))
+    assert serial > 0
+    assert find_diff_paths(chain, range(0, 200, 2), workers=2) == serial
+
+    # Components without check nodes are left out
+    for edge in edges:
+        test_net.add_link(edge[0] + '2', edge[1] + '2', weight=edge[2])
+    test_net.add_link('x', 'y', weight=1)
+    assert find_diff_paths(test_net, ('a', 'b', 'c')) == 7.0
+    assert find_diff_paths(test_net, ('a', 'b2', 'c', 'x')) == find_diff_paths(
+        test_net.compile(), ('a', 'b2', 'c', 'x'))
 
 
 def test_bp_str():
@@ -123,10 +325,10 @@ def test_bp_str():
     #   test_net.add_link(edge[0], edge[1])
 
     # Same network defined above, as tsv
-    test_net, nodes_left, nodes_right = jbp.build_bp_network_from_csv('test.tsv', delim='\t')
+    test_net, nodes_left, nodes_right = build_bp_network_from_csv('test.tsv', delim='\t')
 
-    conn_str_net = jbp.map_bp_str_of_connection(test_net, nodes_right)
-    wt_test_net = jbn.Network()
+    conn_str_net = map_bp_str_of_connection(test_net, nodes_right)
+    wt_test_net = jbnet.Network()
 
     for node in conn_str_net:
         for nbor in conn_str_net[node]:
@@ -141,6 +343,61 @@ def test_bp_str():
     assert diffpaths == 1.0
 
 
+def test_bp_projection():
+    test_net, nodes_left, nodes_right = build_bp_network_from_csv('test.tsv', delim='\t')
+    str_of_connection = map_bp_str_of_connection(test_net, nodes_right)
+
+    projection = project_bp_network(test_net, sorted(nodes_left))
+    for node in str_of_connection:
+        for nbor in str_of_connection[node]:
+            assert projection.link_weight(node, nbor) == str_of_connection[node][nbor]
+    assert projection.link_count == 3
+
+    inv_projection = project_bp_network(test_net.compile(), nodes_left, weight=lambda c: 1.0/c)
+    assert inv_projection.link_weight('b', 'c') == 0.5
+
+    # 'E' links to all of a, b and c; without it, a and b share nothing
+    capped = project_bp_network(test_net, nodes_left, max_degree=2)
+    assert capped.find_neighbors('b') == ['c']
+    assert capped.link_weight('a', 'c') == 2
+
+    pruned = project_bp_network(test_net, nodes_left, top_k=1)
+    assert pruned.link_count == 2 and pruned.link_weight('a', 'c') == 3
+
+    # Nodes with no connection are kept, even when nodes is a generator
+    test_net.add_node('z')
+    from_gen = project_bp_network(test_net, (node for node in sorted(nodes_left) + ['z']))
+    assert sorted(from_gen.nodes) == ['a', 'b', 'c', 'z']
+
+
+def test_bp_top_connections():
+    test_net, nodes_left, nodes_right = build_bp_network_from_csv('test.tsv', delim='\t')
+    strongest = map_bp_strongest_connections(map_bp_str_of_connection(test_net, nodes_right))
+
+    top1 = map_bp_top_connections(test_net, nodes_left)
+    assert sorted((node, top[0][0], top[0][1]) for node, top in top1.items()) == sorted(strongest)
+
+    top2 = map_bp_top_connections(test_net, nodes_left, k=2)
+    assert top2['c'] == [('a', 3), ('b', 2)]
+    assert top2['b'] == [('c', 2), ('a', 1)]
+
+
+def test_bp_csv_int_ids():
+    test_net, nodes_left, nodes_right = build_bp_network_from_csv('test.tsv', delim='\t')
+    int_net, ids_left, ids_right, labels = build_bp_network_from_csv(
+        ['test.tsv', 'test.tsv'], delim='\t', int_ids=True)
+
+    assert set(labels[i] for i in ids_left) == nodes_left == set(['a', 'b', 'c'])
+    assert set(labels[i] for i in ids_right) == nodes_right
+    assert int_net.link_count == test_net.link_count == 9
+    for node in int_net.nodes:
+        nbors = set(labels[nbor] for nbor in int_net.find_neighbors(node))
+        assert nbors == set(test_net.find_neighbors(labels[node]))
+
+
 if __name__ == '__main__':
     test_diffpaths()
-    test_bp_str()
\ No newline at end of file
+    test_bp_str()
+    test_bp_projection()
+    test_bp_top_connections()
+    test_bp_csv_int_ids()
\ No newline at end of file
@@ -5,12 +5,27 @@ Classes:
 Heap
 KeyValueHeap
 HeapOfTuples
+IndexedHeap
+DAryHeap -- addressable heap with d children per node
+PairingHeap -- addressable pairing heap, with cheap decrease_key
+KeyHeap -- heap ordered by a key function, backed by heapq
+ArrayHeap -- compact heap of (float priority, payload) pairs in parallel arrays
 """
+from array import array
+import heapq
+from itertools import count
+
 class Heap:
     """
     Methods:
     insert
     pop
+    peek
+    pushpop
+    replace
+    extend
+    nsmallest
+    pop_many
     index
     list
     check_heap_property
@@ -20,12 +35,9 @@ class Heap:
         self._heap = []
 
         if elements is not None:
-            if is_heap:
-                self._heap = elements[:]
-
-            else:
-                for el in elements:
-                    self.insert(el)
+            self._heap = list(elements)
+            if not is_heap:
+                self._heapify()
 
     def insert(self, element):
         self._heap.append(element)
@@ -34,6 +46,10 @@ class Heap:
     def index(self, element):
         return self._heap.index(element)
 
+    def peek(self):
+        """Return the smallest element without removing it, None if empty."""
+        return self._heap[0] if self._heap else None
+
     def pop(self):
         if len(self._heap) == 1:
             return self._heap.pop()
@@ -45,55 +61,108 @@ class Heap:
             self._down_heapify(0)
             return val
 
+    def pushpop(self, element):
+        """Insert element, then pop and return the smallest element (faster than both)."""
+        if self._heap and self.is_less_than(self._heap[0], element):
+            val = self._heap[0]
+            self._heap[0] = element
+            self._down_heapify(0)
+            return val
+        return element
+
+    def replace(self, element):
+        """Pop and return the smallest element, then insert element (faster than both)."""
+        if len(self._heap) == 0:
+            self.insert(element)
+            return None
+        val = self._heap[0]
+        self._heap[0] = element
+        self._down_heapify(0)
+        return val
+
+    def extend(self, elements):
+        """
+        Insert several elements.
+
+        If there are many of them compared to the size of the heap, the
+        whole heap is rebuilt in O(n) instead of inserting one at a time.
+        """
+        start = len(self._heap)
+        self._heap.extend(elements)
+        added = len(self._heap) - start
+        if added * max(1, start.bit_length()) > len(self._heap):
+            self._heapify()
+        else:
+            for i in range(start, len(self._heap)):
+                self._up_heapify(i)
+
+    def nsmallest(self, n):
+        """Return the n smallest elements, smallest first, without removing them."""
+        L = self._heap
+        frontier = _Frontier(self)
+        if L:
+            frontier.insert(0)
+        smallest = []
+        while len(smallest) < n and len(frontier) > 0:
+            i = frontier.pop()
+            smallest.append(L[i])
+            for i_child in self._children(i):
+                frontier.insert(i_child)
+        return smallest
+
+    def pop_many(self, n):
+        """Pop and return the n smallest elements (fewer if the heap runs out), smallest first."""
+        pop = self.pop
+        return [pop() for _ in range(min(n, len(self._heap)))]
+
     def __len__(self):
         return len(self._heap)
 
     def list(self):
         return self._heap
 
+    def _children(self, i):
+        return range(2*i+1, min(2*i+3, len(self._heap)))
+
+    def _heapify(self):
+        """Restore the heap property of the whole list, bottom-up, in O(n)."""
+        for i in reversed(range(len(self._heap)//2)):
+            self._down_heapify(i)
+
     def _up_heapify(self, i):
         L = self._heap
-        parent = self._parent
         is_less_than = self.is_less_than
+        el = L[i]
 
         while i > 0:
-            if is_less_than(L[i],  L[parent(i)]):
-                L[i], L[parent(i)] = L[parent(i)], L[i]
-                i = parent(i)
+            i_parent = (i-1)//2
+            if is_less_than(el, L[i_parent]):
+                L[i] = L[i_parent]
+                i = i_parent
             else:
                 break
-        return
+        L[i] = el
 
     def _down_heapify(self, i):
         L = self._heap
-        lchild = self._left_child
-        rchild = self._right_child
         is_less_than = self.is_less_than
-        one_child = self._one_child
-        is_leaf = self._is_leaf
+        n = len(L)
+        el = L[i]
 
-        while i < len(L)-1:
-            if is_leaf(i):
+        while True:
+            i_child = 2*i+1
+            if i_child >= n:
                 break
+            # Find smallest child
+            if i_child+1 < n and is_less_than(L[i_child+1], L[i_child]):
+                i_child += 1
+            # If the smallest child is smaller, move it up
+            if is_less_than(L[i_child], el):
+                L[i] = L[i_child]
+                i = i_child
             else:
-                if one_child(i):
-                    if is_less_than(L[lchild(i)], L[i]):
-                        L[i], L[lchild(i)] = L[lchild(i)], L[i]
-                    break
-                else:
-                    # Find smallest child
-                    if is_less_than(L[rchild(i)], L[lchild(i)]):
-                        i_child = rchild(i)
-                    else:
-                        i_child = lchild(i)
-
-                    # If the smallest child is smaller, swap
-                    if is_less_than(L[i_child], L[i]):
-                        L[i], L[i_child] = L[i_child], L[i]
-                        i = i_child
-                    else:
-                        break
-
+                break
+        L[i] = el
 
     def is_less_than(self, el1, el2):
         return el1 < el2
@@ -132,6 +201,17 @@ class Heap:
         return True
 
 
+class _Frontier(Heap):
+    """Heap of positions in another heap, ordered by the elements at those positions."""
+    def __init__(self, heap):
+        self._of = heap
+        super().__init__()
+
+    def is_less_than(self, el1, el2):
+        L = self._of.list()
+        return self._of.is_less_than(L[el1], L[el2])
+
+
 class KeyValueHeap(Heap):
     """
     A heap of key-value pairs.
@@ -154,10 +234,8 @@ class KeyValueHeap(Heap):
         return el1[0] < el2[0]
 
     def keys(self):
-        i = 0
-        while i < len(self._heap):
-        	i += 1
-            yield self._heap[i]
+        for el in self._heap:
+            yield el[0]
     
 
 class HeapOfTuples(Heap):
@@ -176,6 +254,7 @@ class HeapOfTuples(Heap):
 
     Overriden methods:
     is_less_than
+    _up_heapify, _down_heapify -- compare el[i_val] directly, without a method call
     """
     def __init__(self, i_val, elements=None, is_heap=False):
         """
@@ -190,6 +269,709 @@ class HeapOfTuples(Heap):
     def is_less_than(self, el1, el2):
         return el1[self.i_val] < el2[self.i_val]
 
+    def _up_heapify(self, i):
+        L = self._heap
+        i_val = self.i_val
+        el = L[i]
+        val = el[i_val]
+
+        while i > 0:
+            i_parent = (i-1)//2
+            if val < L[i_parent][i_val]:
+                L[i] = L[i_parent]
+                i = i_parent
+            else:
+                break
+        L[i] = el
+
+    def _down_heapify(self, i):
+        L = self._heap
+        i_val = self.i_val
+        n = len(L)
+        el = L[i]
+        val = el[i_val]
+
+        while True:
+            i_child = 2*i+1
+            if i_child >= n:
+                break
+            # Find smallest child
+            if i_child+1 < n and L[i_child+1][i_val] < L[i_child][i_val]:
+                i_child += 1
+            if L[i_child][i_val] < val:
+                L[i] = L[i_child]
+                i = i_child
+            else:
+                break
+        L[i] = el
+
+
+class IndexedHeap(HeapOfTuples):
+    """
+    An addressable heap of tuples, with at most one entry per key.
+
+    A key -> position index is kept up to date on every swap, so entries
+    can be found and re-prioritized in O(log n) instead of O(n).
+
+    Methods inherited from HeapOfTuples:
+    list
+    check_heap_property
+    is_less_than
+
+    Extended methods:
+    __init__
+    insert
+    pop
+    pushpop
+    replace
+    extend
+
+    New methods:
+    contains
+    get
+    decrease_key
+    update
+    """
+    def __init__(self, i_key, i_val, elements=None, is_heap=False):
+        """
+        Arguments
+        i_key -- the position (index) of the element of the tuple identifying the entry
+        i_val -- the position (index) of the element of the tuple to compare
+        elements -- list of elements to add to the heap
+        is_heap -- set to True is elements is already a heap
+        """
+        self.i_key = i_key
+        self._pos = {}
+        super().__init__(i_val, elements=elements, is_heap=is_heap)
+        if is_heap:
+            self._pos = {el[i_key]: i for i, el in enumerate(self._heap)}
+
+    def insert(self, element):
+        """Add element to the heap. Raise KeyError if its key is already in the heap."""
+        key = element[self.i_key]
+        if key in self._pos:
+            raise KeyError(key)
+        self._heap.append(element)
+        self._pos[key] = len(self._heap) - 1
+        self._up_heapify(len(self._heap) - 1)
+
+    def pop(self):
+        if len(self._heap) == 0:
+            return None
+        val = self._heap[0]
+        del self._pos[val[self.i_key]]
+        last = self._heap.pop()
+        if len(self._heap) > 0:
+            self._heap[0] = last
+            self._pos[last[self.i_key]] = 0
+            self._down_heapify(0)
+        return val
+
+    def pushpop(self, element):
+        """Insert element, then pop and return the smallest element."""
+        key = element[self.i_key]
+        if key in self._pos:
+            raise KeyError(key)
+        L = self._heap
+        if L and L[0][self.i_val] < element[self.i_val]:
+            val = L[0]
+            del self._pos[val[self.i_key]]
+            L[0] = element
+            self._down_heapify(0)
+            return val
+        return element
+
+    def replace(self, element):
+        """Pop and return the smallest element, then insert element."""
+        if len(self._heap) == 0:
+            self.insert(element)
+            return None
+        key = element[self.i_key]
+        val = self._heap[0]
+        if key in self._pos and key != val[self.i_key]:
+            raise KeyError(key)
+        del self._pos[val[self.i_key]]
+        self._heap[0] = element
+        self._down_heapify(0)
+        return val
+
+    def extend(self, elements):
+        """Insert several elements. Raise KeyError if a key is repeated or already in the heap."""
+        elements = list(elements)
+        keys = set()
+        for el in elements:
+            key = el[self.i_key]
+            if key in self._pos or key in keys:
+                raise KeyError(key)
+            keys.add(key)
+        super().extend(elements)
+
+    def index(self, key):
+        return self._pos[key]
+
+    def contains(self, key):
+        return key in self._pos
+
+    __contains__ = contains
+
+    def get(self, key):
+        """Return the entry for key."""
+        return self._heap[self._pos[key]]
+
+    def decrease_key(self, element):
+        """
+        Replace the entry with the same key as element, if element is smaller.
+
+        Return True if the entry was replaced.
+        """
+        i = self._pos[element[self.i_key]]
+        if self.is_less_than(element, self._heap[i]):
+            self._heap[i] = element
+            self._up_heapify(i)
+            return True
+        return False
+
+    def update(self, element):
+        """Insert element, or replace the entry with the same key (up or down)."""
+        key = element[self.i_key]
+        if key not in self._pos:
+            self.insert(element)
+            return
+        i = self._pos[key]
+        old = self._heap[i]
+        self._heap[i] = element
+        if self.is_less_than(element, old):
+            self._up_heapify(i)
+        else:
+            self._down_heapify(i)
+
+    def _heapify(self):
+        pos = {}
+        for i, el in enumerate(self._heap):
+            key = el[self.i_key]
+            if key in pos:
+                raise KeyError(key)
+            pos[key] = i
+        self._pos = pos
+        super()._heapify()
+
+    def _up_heapify(self, i):
+        L = self._heap
+        pos = self._pos
+        i_key = self.i_key
+        i_val = self.i_val
+        el = L[i]
+        val = el[i_val]
+
+        while i > 0:
+            i_parent = (i-1)//2
+            parent = L[i_parent]
+            if val < parent[i_val]:
+                L[i] = parent
+                pos[parent[i_key]] = i
+                i = i_parent
+            else:
+                break
+        L[i] = el
+        pos[el[i_key]] = i
+
+    def _down_heapify(self, i):
+        L = self._heap
+        pos = self._pos
+        i_key = self.i_key
+        i_val = self.i_val
+        n = len(L)
+        el = L[i]
+        val = el[i_val]
+
+        while True:
+            i_child = 2*i+1
+            if i_child >= n:
+                break
+            # Find smallest child
+            if i_child+1 < n and L[i_child+1][i_val] < L[i_child][i_val]:
+                i_child += 1
+            child = L[i_child]
+            if child[i_val] < val:
+                L[i] = child
+                pos[child[i_key]] = i
+                i = i_child
+            else:
+                break
+        L[i] = el
+        pos[el[i_key]] = i
+
+
+class DAryHeap(IndexedHeap):
+    """
+    An addressable d-ary heap of tuples.
+
+    Each entry has d children, so the heap is log_d(n) deep: insert and
+    decrease_key sift up through fewer levels, while pop compares up to d
+    children per level. This suits Djikstra, which makes many more
+    decrease_key calls than pops.
+
+    Same methods as IndexedHeap.
+    """
+    def __init__(self, i_key, i_val, elements=None, is_heap=False, d=4):
+        """
+        Arguments
+        i_key -- the position (index) of the element of the tuple identifying the entry
+        i_val -- the position (index) of the element of the tuple to compare
+        elements -- list of elements to add to the heap
+        is_heap -- set to True is elements is already a heap
+        d -- number of children per entry
+        """
+        self.d = d
+        super().__init__(i_key, i_val, elements=elements, is_heap=is_heap)
+
+    def _children(self, i):
+        return range(self.d*i+1, min(self.d*i+self.d+1, len(self._heap)))
+
+    def _up_heapify(self, i):
+        L = self._heap
+        pos = self._pos
+        i_key = self.i_key
+        i_val = self.i_val
+        d = self.d
+        el = L[i]
+        val = el[i_val]
+
+        while i > 0:
+            i_parent = (i-1)//d
+            parent = L[i_parent]
+            if val < parent[i_val]:
+                L[i] = parent
+                pos[parent[i_key]] = i
+                i = i_parent
+            else:
+                break
+        L[i] = el
+        pos[el[i_key]] = i
+
+    def _down_heapify(self, i):
+        L = self._heap
+        pos = self._pos
+        i_key = self.i_key
+        i_val = self.i_val
+        d = self.d
+        n = len(L)
+        el = L[i]
+        val = el[i_val]
+
+        while True:
+            first = d*i+1
+            if first >= n:
+                break
+            # Find smallest child
+            i_child = first
+            child_val = L[first][i_val]
+            for j in range(first+1, min(first+d, n)):
+                if L[j][i_val] < child_val:
+                    i_child = j
+                    child_val = L[j][i_val]
+            if child_val < val:
+                child = L[i_child]
+                L[i] = child
+                pos[child[i_key]] = i
+                i = i_child
+            else:
+                break
+        L[i] = el
+        pos[el[i_key]] = i
+
+    def check_heap_property(self):
+        L = self._heap
+        i_val = self.i_val
+        return all(not L[i][i_val] < L[(i-1)//self.d][i_val] for i in range(1, len(L)))
+
+
+class _PairingNode:
+    """Entry of a PairingHeap: first child, next sibling, and previous sibling (or parent)."""
+    __slots__ = ('element', 'child', 'sibling', 'prev')
+
+    def __init__(self, element):
+        self.element = element
+        self.child = None
+        self.sibling = None
+        self.prev = None
+
+
+class PairingHeap:
+    """
+    An addressable pairing heap of tuples, with at most one entry per key.
+
+    insert and decrease_key are O(1): they only link a tree under the
+    root (or the root under it). The restructuring is deferred to pop,
+    which pairs up the children of the root in amortized O(log n).
+
+    Methods:
+    insert
+    pop
+    peek
+    contains
+    get
+    decrease_key
+    update
+    list
+    check_heap_property
+    """
+    def __init__(self, i_key, i_val, elements=None):
+        """
+        Arguments
+        i_key -- the position (index) of the element of the tuple identifying the entry
+        i_val -- the position (index) of the element of the tuple to compare
+        elements -- list of elements to add to the heap
+        """
+        self.i_key = i_key
+        self.i_val = i_val
+        self._root = None
+        self._nodes = {}
+        if elements is not None:
+            for el in elements:
+                self.insert(el)
+
+    def insert(self, element):
+        """Add element to the heap. Raise KeyError if its key is already in the heap."""
+        key = element[self.i_key]
+        if key in self._nodes:
+            raise KeyError(key)
+        node = _PairingNode(element)
+        self._nodes[key] = node
+        self._root = node if self._root is None else self._link(self._root, node)
+
+    def peek(self):
+        """Return the smallest element without removing it, None if empty."""
+        return self._root.element if self._root is not None else None
+
+    def pop(self):
+        root = self._root
+        if root is None:
+            return None
+        del self._nodes[root.element[self.i_key]]
+        self._root = self._merge_pairs(root.child)
+        return root.element
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def contains(self, key):
+        return key in self._nodes
+
+    __contains__ = contains
+
+    def get(self, key):
+        """Return the entry for key."""
+        return self._nodes[key].element
+
+    def decrease_key(self, element):
+        """
+        Replace the entry with the same key as element, if element is smaller.
+
+        Return True if the entry was replaced.
+        """
+        node = self._nodes[element[self.i_key]]
+        if not element[self.i_val] < node.element[self.i_val]:
+            return False
+        node.element = element
+        if node is not self._root:
+            self._cut(node)
+            self._root = self._link(self._root, node)
+        return True
+
+    def update(self, element):
+        """Insert element, or replace the entry with the same key (up or down)."""
+        key = element[self.i_key]
+        if key not in self._nodes:
+            self.insert(element)
+            return
+        if self.decrease_key(element):
+            return
+        node = self._nodes.pop(key)
+        if node is self._root:
+            self._root = self._merge_pairs(node.child)
+        else:
+            self._cut(node)
+            subtree = self._merge_pairs(node.child)
+            if subtree is not None:
+                self._root = self._link(self._root, subtree)
+        self.insert(element)
+
+    def list(self):
+        """Return the elements, in no particular order."""
+        return [node.element for node in self._nodes.values()]
+
+    def check_heap_property(self):
+        i_val = self.i_val
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            child = node.child
+            while child is not None:
+                if child.element[i_val] < node.element[i_val]:
+                    return False
+                stack.append(child)
+                child = child.sibling
+        return True
+
+    def _link(self, node1, node2):
+        """Make the larger of two roots the first child of the other; return the new root."""
+        if node2.element[self.i_val] < node1.element[self.i_val]:
+            node1, node2 = node2, node1
+        node2.prev = node1
+        node2.sibling = node1.child
+        if node1.child is not None:
+            node1.child.prev = node2
+        node1.child = node2
+        return node1
+
+    @staticmethod
+    def _cut(node):
+        """Detach the subtree of node (not the root) from its parent."""
+        prev = node.prev
+        if prev.child is node:
+            prev.child = node.sibling
+        else:
+            prev.sibling = node.sibling
+        if node.sibling is not None:
+            node.sibling.prev = prev
+        node.prev = None
+        node.sibling = None
+
+    def _merge_pairs(self, first):
+        """Merge a list of sibling trees into one (two-pass pairing); return its root."""
+        trees = []
+        node = first
+        while node is not None:
+            next_node = node.sibling
+            node.prev = None
+            node.sibling = None
+            trees.append(node)
+            node = next_node
+        if not trees:
+            return None
+
+        link = self._link
+        paired = [link(trees[i], trees[i+1]) if i+1 < len(trees) else trees[i]
+                  for i in range(0, len(trees), 2)]
+        root = paired.pop()
+        while paired:
+            root = link(paired.pop(), root)
+        return root
+
+
+class KeyHeap:
+    """
+    A heap ordered by key(element), backed by the C heapq module.
+
+    Entries are stored as (key, counter, element), so heapq compares keys
+    directly and the counter breaks ties without comparing elements.
+    There is no method call per comparison, which makes it much faster
+    than HeapOfTuples for large heaps.
+
+    Methods:
+    insert
+    pop
+    peek
+    pushpop
+    replace
+    extend
+    nsmallest
+    pop_many
+    list
+    check_heap_property
+    """
+    def __init__(self, key=None, elements=None):
+        """
+        Arguments
+        key -- function of an element giving its priority (default: the element itself)
+        elements -- list of elements to add to the heap
+        """
+        self.key = key if key is not None else lambda el: el
+        self._count = count()
+        self._heap = []
+        if elements is not None:
+            self.extend(elements)
+
+    def _entry(self, element):
+        return (self.key(element), next(self._count), element)
+
+    def insert(self, element):
+        heapq.heappush(self._heap, self._entry(element))
+
+    def peek(self):
+        """Return the smallest element without removing it, None if empty."""
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self):
+        if len(self._heap) == 0:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def pushpop(self, element):
+        """Insert element, then pop and return the smallest element."""
+        return heapq.heappushpop(self._heap, self._entry(element))[2]
+
+    def replace(self, element):
+        """Pop and return the smallest element, then insert element."""
+        if len(self._heap) == 0:
+            self.insert(element)
+            return None
+        return heapq.heapreplace(self._heap, self._entry(element))[2]
+
+    def extend(self, elements):
+        """Insert several elements, rebuilding the heap in O(n)."""
+        self._heap.extend(self._entry(el) for el in elements)
+        heapq.heapify(self._heap)
+
+    def nsmallest(self, n):
+        """Return the n smallest elements, smallest first, without removing them."""
+        return [entry[2] for entry in heapq.nsmallest(n, self._heap)]
+
+    def pop_many(self, n):
+        """Pop and return the n smallest elements (fewer if the heap runs out), smallest first."""
+        L = self._heap
+        heappop = heapq.heappop
+        return [heappop(L)[2] for _ in range(min(n, len(L)))]
+
+    def __len__(self):
+        return len(self._heap)
+
+    def list(self):
+        return [entry[2] for entry in self._heap]
+
+    def check_heap_property(self):
+        L = self._heap
+        return all(not L[i] < L[(i-1)//2] for i in range(1, len(L)))
+
+
+class ArrayHeap:
+    """
+    A compact heap of (priority, payload) pairs.
+
+    Priorities are kept in an array('d') and payloads in a parallel list,
+    or in an array of payload_typecode (e.g. 'q' for integer node ids).
+    No tuple is stored per entry, so an entry takes 16 bytes with an
+    integer payload array, against about 64 for a tuple in HeapOfTuples,
+    and comparisons are plain float compares.
+
+    Methods:
+    insert
+    pop
+    peek
+    extend
+    pop_many
+    list
+    check_heap_property
+    """
+    __slots__ = ('_priorities', '_payloads')
+
+    def __init__(self, elements=None, payload_typecode=None):
+        """
+        Arguments
+        elements -- list of (priority, payload) pairs to add to the heap
+        payload_typecode -- array typecode of the payloads, or None to keep them in a list
+        """
+        self._priorities = array('d')
+        self._payloads = [] if payload_typecode is None else array(payload_typecode)
+        if elements is not None:
+            self.extend(elements)
+
+    def insert(self, priority, payload):
+        self._priorities.append(priority)
+        self._payloads.append(payload)
+        self._up_heapify(len(self._priorities)-1)
+
+    def peek(self):
+        """Return the (priority, payload) pair with the smallest priority, None if empty."""
+        if len(self._priorities) == 0:
+            return None
+        return (self._priorities[0], self._payloads[0])
+
+    def pop(self):
+        """Remove and return the (priority, payload) pair with the smallest priority."""
+        P = self._priorities
+        V = self._payloads
+        if len(P) == 0:
+            return None
+        top = (P[0], V[0])
+        last_priority = P.pop()
+        last_payload = V.pop()
+        if len(P) > 0:
+            P[0] = last_priority
+            V[0] = last_payload
+            self._down_heapify(0)
+        return top
+
+    def extend(self, elements):
+        """Insert several (priority, payload) pairs, rebuilding the heap in O(n)."""
+        P = self._priorities
+        V = self._payloads
+        for priority, payload in elements:
+            P.append(priority)
+            V.append(payload)
+        for i in reversed(range(len(P)//2)):
+            self._down_heapify(i)
+
+    def pop_many(self, n):
+        """Pop and return the n smallest pairs (fewer if the heap runs out), smallest first."""
+        pop = self.pop
+        return [pop() for _ in range(min(n, len(self._priorities)))]
+
+    def __len__(self):
+        return len(self._priorities)
+
+    def list(self):
+        return list(zip(self._priorities, self._payloads))
+
+    def _up_heapify(self, i):
+        P = self._priorities
+        V = self._payloads
+        priority = P[i]
+        payload = V[i]
+
+        while i > 0:
+            i_parent = (i-1)//2
+            if priority < P[i_parent]:
+                P[i] = P[i_parent]
+                V[i] = V[i_parent]
+                i = i_parent
+            else:
+                break
+        P[i] = priority
+        V[i] = payload
+
+    def _down_heapify(self, i):
+        P = self._priorities
+        V = self._payloads
+        n = len(P)
+        priority = P[i]
+        payload = V[i]
+
+        while True:
+            i_child = 2*i+1
+            if i_child >= n:
+                break
+            # Find smallest child, reading each priority once
+            child_priority = P[i_child]
+            if i_child+1 < n:
+                right_priority = P[i_child+1]
+                if right_priority < child_priority:
+                    i_child += 1
+                    child_priority = right_priority
+            if child_priority < priority:
+                P[i] = child_priority
+                V[i] = V[i_child]
+                i = i_child
+            else:
+                break
+        P[i] = priority
+        V[i] = payload
+
+    def check_heap_property(self):
+        P = self._priorities
+        return all(not P[i] < P[(i-1)//2] for i in range(1, len(P)))
+
 
 import random
 
@@ -215,6 +997,130 @@ def test2():
     assert heap.check_heap_property()
 
 
+def test3():
+    heap = IndexedHeap(0, 1)
+    for i in range(1000):
+        heap.insert((i, random.randint(0,30000)))
+
+    for i in range(0, 1000, 7):
+        heap.decrease_key((i, heap.get(i)[1] - random.randint(0,100)))
+    for i in range(1, 1000, 11):
+        heap.update((i, random.randint(0,30000)))
+
+    assert heap.check_heap_property()
+    assert all(heap.index(el[0]) == i for i, el in enumerate(heap.list()))
+    assert heap.contains(5)
+    assert not heap.decrease_key((5, heap.get(5)[1] + 1))
+
+    last = heap.pop()
+    while len(heap) > 0:
+        el = heap.pop()
+        assert el[1] >= last[1]
+        last = el
+    assert not heap.contains(5)
+
+
+def test4():
+    values = [random.randint(0, 1000) for _ in range(500)]
+    tuples = [(i, v) for i, v in enumerate(values)]
+    heaps = [
+        (Heap(values), lambda el: el),
+        (HeapOfTuples(1, tuples), lambda el: el[1]),
+        (IndexedHeap(0, 1, tuples), lambda el: el[1]),
+        (DAryHeap(0, 1, tuples, d=4), lambda el: el[1]),
+        (KeyHeap(lambda el: el[1], tuples), lambda el: el[1]),
+    ]
+    for heap, key in heaps:
+        assert heap.check_heap_property()
+        assert [key(el) for el in heap.nsmallest(10)] == sorted(values)[:10]
+        assert len(heap) == 500
+
+        extra = [(i, random.randint(0, 1000)) for i in range(500, 520)]
+        if isinstance(heap, Heap) and not isinstance(heap, HeapOfTuples):
+            extra = [el[1] for el in extra]
+        heap.extend(extra[:10])
+        assert heap.check_heap_property()
+
+        smallest = heap.peek()
+        assert heap.pushpop(extra[10]) in (smallest, extra[10])
+        assert heap.replace(extra[11]) is not None
+        assert heap.check_heap_property()
+
+        popped = heap.pop_many(600)
+        assert len(popped) == 510 and len(heap) == 0
+        assert all(key(a) <= key(b) for a, b in zip(popped, popped[1:]))
+        assert heap.pop_many(1) == []
+
+    heap = IndexedHeap(0, 1, [(0, 5), (1, 3)])
+    try:
+        heap.extend([(0, 1)])
+        assert False
+    except KeyError:
+        pass
+    assert heap.replace((2, 4)) == (1, 3)
+    assert heap.contains(2) and not heap.contains(1)
+    assert heap.pushpop((1, 1)) == (1, 1)
+    assert all(heap.index(el[0]) == i for i, el in enumerate(heap.list()))
+
+
+def test5():
+    heaps = [IndexedHeap(0, 1), DAryHeap(0, 1, d=3), PairingHeap(0, 1)]
+    # Distinct priorities, so the pop order does not depend on tie-breaking
+    priorities = iter(random.sample(range(10**6), 4000))
+    ops = []
+    for i in range(2000):
+        ops.append(('insert', (i, next(priorities))))
+        if i % 3 == 0:
+            ops.append(('decrease_key', (i // 2, next(priorities))))
+        if i % 5 == 0:
+            ops.append(('update', (i // 3, next(priorities))))
+        if i % 7 == 0:
+            ops.append(('pop', None))
+
+    results = []
+    for heap in heaps:
+        popped = []
+        for op, el in ops:
+            if op == 'pop':
+                popped.append(heap.pop())
+            elif op == 'insert':
+                heap.insert(el)
+            elif heap.contains(el[0]):
+                getattr(heap, op)(el)
+        assert heap.check_heap_property()
+        while len(heap) > 0:
+            popped.append(heap.pop())
+        results.append(popped)
+        assert heap.pop() is None
+
+    assert results[0] == results[1] == results[2]
+
+
+def test6():
+    pairs = [(random.random(), i) for i in range(2000)]
+    for typecode in (None, 'q'):
+        heap = ArrayHeap(pairs[:1000], payload_typecode=typecode)
+        for priority, payload in pairs[1000:]:
+            heap.insert(priority, payload)
+        assert heap.check_heap_property()
+        assert heap.peek() == min(pairs)
+        assert heap.pop_many(10) == sorted(pairs)[:10]
+        popped = [heap.pop() for _ in range(len(heap))]
+        assert popped == sorted(pairs)[10:]
+        assert heap.pop() is None and heap.peek() is None
+
+    heap = ArrayHeap()
+    try:
+        heap.extra = 1
+        assert False
+    except AttributeError:
+        pass
+
+
 if __name__ == "__main__":
     test1()
-    test2()
\ No newline at end of file
+    test2()
+    test3()
+    test4()
+    test5()
+    test6()
\ No newline at end of file
@@ -3,9 +3,27 @@ Tools for creating and editing networks, and algorithms for computing their prop
 
 Classes:
 Network  -- a network of nodes
+CompiledNetwork  -- frozen, integer-indexed (CSR) view of a Network
 RSTree  -- rooted spanning tree, created from a Network object
+BottleneckTree  -- lowest-peak (minimax) path queries on a minimum spanning tree
+
+Functions:
+read_edges  -- stream links from an edge-list file
 """
-__all__ = ['Network', 'RSTree']
+__all__ = ['Network', 'CompiledNetwork', 'RSTree', 'BottleneckTree', 'read_edges']
+
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import gzip
+import math
+import mmap as mm
+import multiprocessing
+import pickle
+import random
+import struct
+import sys
 
 import jbheap as jbh
 
@@ -18,16 +36,42 @@ class Network:
     add_link -- add link between two nodes
     del_link -- remove link between two nodes
     del_node -- remove nodes and all links to it
+    add_links -- add many links
+    del_nodes -- remove many nodes and all links to them
     link_weight -- get weight of link between two nodes
     find_neighbors -- get neighbors (linked nodes) of node
+    iter_neighbors -- iterate over neighbors of node without copying them
+    traverse -- breadth-first traversal from a node
+    connected_components -- list the connected components of the network
     prune_network -- prune network, keeping specified nodes
     prune_network_random -- prune network, keeping random nodes
     map_distance_to_node -- map lengths of shortest paths to a node
     map_weighted_distance_to_node -- map weights of lightest paths to a node
+    map_lowest_peak_to_node -- map lowest peaks of paths to a node
+    map_weighted_distances -- matrix of weights of lightest paths between all nodes
+    shortest_path -- shortest path between two nodes
+    minimum_spanning_tree -- minimum spanning tree (forest) of the network
     compute_node_centrality -- compute centrality (average distance) of a node
     compute_node_cc -- compute clustering coefficient of a node
+    triangle_count -- map number of triangles through each node
+    map_cc -- map clustering coefficient for all nodes
+    average_cc -- average clustering coefficient
+    transitivity -- global clustering coefficient (transitivity)
+    estimate_node_cc -- estimate clustering coefficient of a node by sampling
+    estimate_cc -- estimate average clustering coefficient by sampling
+    estimate_ac -- estimate centrality of nodes by sampling
     map_ac -- map centrality for all nodes
     map_ac2 -- map centrality for all nodes, different implementation
+    map_distances_from -- map lengths of shortest paths from many nodes at once
+    compile -- create a frozen CompiledNetwork from the network
+    compile_components -- compile only the components containing some nodes
+    save -- save the network in binary form (see CompiledNetwork.save)
+    load -- (static) load a binary network as a CompiledNetwork
+    cache_info -- hit/miss counters and size of the distance map cache
+
+    Class methods:
+    from_edges -- create a network from an iterable of links
+    from_edge_file -- create a network from an edge-list file
 
     Properties:
     nodes -- list of nodes in the network
@@ -35,19 +79,70 @@ class Network:
     link_count -- number of links in the network
     bridge_links -- links that are the only path between two components
     """
-    def __init__(self, from_dict=None):
+    def __init__(self, from_dict=None, cache_size=0):
         """Create a network, optionally from a dictionary, else empty.
 
         Keyword arguments:
         fromDict -- dictionary from which to create the network
+        cache_size -- maximum number of entries (reachable nodes, summed over
+                      all maps) kept in the cache of distance maps. The
+                      cache is disabled if 0.
 
         Dictionary format: {node1:{node2:1, node3:1}}
+
+        The cache is invalidated by the methods changing the network; a
+        dictionary passed as from_dict must not be changed directly.
         """
         self._rstree = None
+        # Incremented on every change, to invalidate cached results
+        self._version = 0
+        self._cache = _DistanceCache(cache_size) if cache_size > 0 else None
         if from_dict is None:
             self._net = {}
         else:
             self._net = from_dict
+        # Self-links appear once in the adjacency, other links twice
+        self._link_count = (sum(len(links) for links in self._net.values()) +
+                            sum(1 for node, links in self._net.items() if node in links)) // 2
+
+    @classmethod
+    def from_edges(cls, edges, weighted=False, cache_size=0):
+        """
+        Create a network from an iterable of links, in one pass.
+
+        edges yields (node1, node2) tuples, or (node1, node2, weight) tuples
+        if weighted is True. The adjacency is built directly, without the
+        per-link checks of add_link.
+        """
+        net = {}
+        weight = 1
+        for edge in edges:
+            if weighted:
+                node1, node2, weight = edge
+            else:
+                node1, node2 = edge[0], edge[1]
+            links1 = net.get(node1)
+            if links1 is None:
+                links1 = net[node1] = {}
+            links2 = net.get(node2)
+            if links2 is None:
+                links2 = net[node2] = {}
+            links1[node2] = weight
+            links2[node1] = weight
+        return cls(from_dict=net, cache_size=cache_size)
+
+    @classmethod
+    def from_edge_file(cls, paths, delim=None, weighted=False, node_type=str,
+                       weight_type=float, cache_size=0):
+        """
+        Create a network from one or more edge-list files.
+
+        The files are streamed, never read whole; see read_edges for the
+        file format and the arguments.
+        """
+        return cls.from_edges(read_edges(paths, delim=delim, weighted=weighted,
+                                         node_type=node_type, weight_type=weight_type),
+                              weighted=weighted, cache_size=cache_size)
 
     def __len__(self):
         return self.node_count
@@ -56,6 +151,7 @@ class Network:
         """Create a new (unconnected) node in the graph."""
         if node not in self._net:
             self._net[node] = {}
+            self._version += 1
 
     def add_link(self, node1, node2, weight=1):
         """Make a link between nodes.
@@ -63,42 +159,94 @@ class Network:
         n1 and n2 are created if they did not already exist."""
         self.add_node(node1)
         self.add_node(node2)
+        self._version += 1
+        is_new = node2 not in self._net[node1]
         self._net[node1][node2] = weight
         self._net[node2][node1] = weight
+        if is_new:
+            self._link_count += 1
+            if self._rstree is not None and not self._rstree.add_link(node1, node2):
+                self._rstree = None
+
+    def add_links(self, links):
+        """
+        Make links between nodes.
+
+        links is an iterable of (node1, node2) or (node1, node2, weight) tuples.
+        """
+        for link in links:
+            self.add_link(*link)
 
     def del_link(self, node1, node2):
         """Delete link between nodes"""
         del self._net[node1][node2]
         del self._net[node2][node1]
+        self._link_count -= 1
+        self._version += 1
+        if self._rstree is not None and not self._rstree.del_link(node1, node2):
+            self._rstree = None
 
     def del_node(self, node):
         """Delete node and all links to it."""
-        del self._net[node]
-        for node2 in self._net:
-            if node in self._net[node2]:
+        links = self._net.pop(node)
+        for node2 in links:
+            if node2 != node:
                 del self._net[node2][node]
+        self._link_count -= len(links)
+        self._version += 1
+        if self._rstree is not None and not self._rstree.del_node(node):
+            self._rstree = None
+
+    def del_nodes(self, nodes):
+        """Delete nodes and all links to them."""
+        for node in nodes:
+            self.del_node(node)
 
     def link_weight(self, node1, node2):
         return self._net[node1][node2]
 
     def prune_network_random(self, prob):
-        for node in self.nodes:
-            if random.random() > prob:
-                self.del_node(node)
+        self.del_nodes([node for node in self._net if random.random() > prob])
 
     def prune_network(self, nodes_to_keep):
-        for node in self.nodes:
-            if not node in nodes_to_keep:
-                self.del_node(node)
+        nodes_to_keep = set(nodes_to_keep)
+        self.del_nodes([node for node in self._net if node not in nodes_to_keep])
 
     def find_neighbors(self, node):
         """Return list of neighbors of node."""
         return [neighbor for neighbor in self._net[node]]
 
+    def iter_neighbors(self, node):
+        """Return an iterator over the neighbors of node, without copying them."""
+        return iter(self._net[node])
+
+    def traverse(self, node):
+        """
+        Traverse the component of node breadth-first.
+
+        Yield (node, depth, parent) for every reachable node, starting
+        with (node, 0, None).
+        """
+        net = self._net
+        depth_of = {node: 0}
+        queue = deque([(node, None)])
+        while queue:
+            current, parent = queue.popleft()
+            depth = depth_of[current]
+            yield current, depth, parent
+            for neighbor in net[current]:
+                if neighbor not in depth_of:
+                    depth_of[neighbor] = depth + 1
+                    queue.append((neighbor, current))
+
+    def connected_components(self):
+        """Return the connected components of the network, as lists of nodes."""
+        return _connected_components(self)
+
     @property
     def link_count(self):
         """Number of links in the network."""
-        return int(sum([len(self._net[n].values()) for n in self._net]) / 2)
+        return self._link_count
 
     @property
     def node_count(self):
@@ -110,46 +258,119 @@ class Network:
         """Nodes in the network."""
         return [node for node in self._net]
 
+    def cache_info(self):
+        """
+        Return the state of the distance map cache.
+
+        Map of format {'hits', 'misses', 'maps', 'entries', 'max_entries'},
+        None if the cache is disabled.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def _cached(self, node, metric, compute_map):
+        """Return compute_map(node), through the distance map cache if enabled."""
+        if self._cache is None:
+            return compute_map(node)
+        dist_map = self._cache.get((node, metric), self._version)
+        if dist_map is None:
+            dist_map = compute_map(node)
+            self._cache.put((node, metric), self._version, dist_map)
+        return dict(dist_map)
+
     @property
     def bridge_links(self):
-        """Bridge links."""
-        if self._rstree == None:
+        """
+        Bridge links.
+
+        The spanning tree used to find them is kept up to date by add_link,
+        del_link and del_node, incrementally where possible.
+        """
+        if self._rstree is None:
             self._rstree = RSTree(self, self.nodes[0])
         return self._rstree.bridge_links
 
+    def compile(self, nodes=None):
+        """
+        Create a frozen, integer-indexed (CSR) copy of the network.
+
+        The copy does not follow later changes to the network.
+
+        nodes -- (optional) only copy these nodes and the links between them
+        """
+        node_ids = self.nodes if nodes is None else list(nodes)
+        index = {node: i for i, node in enumerate(node_ids)}
+        offsets = array('q', [0])
+        neighbors = array('q')
+        weights = array('d')
+
+        for node in node_ids:
+            row = sorted((index[nbor], weight) for nbor, weight in self._net[node].items()
+                         if nbor in index)
+            neighbors.extend(nbor for nbor, _ in row)
+            weights.extend(weight for _, weight in row)
+            offsets.append(len(neighbors))
+
+        return CompiledNetwork(node_ids, offsets, neighbors, weights)
+
+    def compile_components(self, nodes):
+        """
+        Compile (see compile) only the connected components containing nodes.
+
+        The cost is proportional to the size of those components, not of
+        the whole network.
+        """
+        reached = {}  # ordered set
+        for node in nodes:
+            if node not in reached:
+                reached.update((current, None) for current, _, _ in self.traverse(node))
+        return self.compile(nodes=reached)
+
+    def save(self, path):
+        """Save the network in binary form. See CompiledNetwork.save."""
+        self.compile().save(path)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Load a network saved with save, as a CompiledNetwork. See CompiledNetwork.load."""
+        return CompiledNetwork.load(path, mmap=mmap)
+
     def map_distance_to_node(self, node):
         """Map the distance between node n and every reachable node in the graph."""
-        open_list = [node]
-        distance_from_start = {}
-        distance_from_start[node] = 0
-        while len(open_list) > 0:
-            current = open_list[0]
-            del open_list[0]
-            for neighbor in self.find_neighbors(current):
-                if neighbor not in distance_from_start:
-                    distance_from_start[neighbor] = distance_from_start[current] + 1
-                    open_list.append(neighbor)
-        return distance_from_start
+        return self._cached(node, 'hops', lambda node: {
+            current: depth for current, depth, _ in self.traverse(node)})
 
     def compute_node_centrality(self, node):
         """Return the average distance from node to all other reachable nodes."""
-        distances = self.map_distance_to_node(node)
-        return float(sum(distances.values())/len(distances))
+        return _centrality(self.traverse(node))
 
-    def map_ac(self, nodes='all'):
+    def map_ac(self, nodes='all', workers=None):
         """
         Map the average centrality of nodes in the graph.
 
         Keyword arguments:
         nodes -- (optional) list of nodes to map. By default, map all nodes.
+        workers -- (optional) number of worker processes. If more than 1, the
+                   source nodes are split across a process pool.
         """
         if nodes == 'all':
-            nodes = self.nodes
-            
-        acmap = {}
-        for node in nodes:
-            acmap[node] = self.compute_node_centrality(node)
-        return acmap
+            return self.compile().map_ac(workers=workers)
+
+        nodes = list(nodes)
+        if len(nodes) < 64 and (workers is None or workers <= 1):
+            # Less than one batch: the multi-source BFS would not pay for compiling
+            return {node: _centrality(self.traverse(node)) for node in nodes}
+        return self.compile_components(nodes).map_ac(nodes=nodes, workers=workers)
+
+    def map_distances_from(self, sources, batch_size=64):
+        """
+        Map the distance between each source and every node reachable from it.
+
+        Return a map of format {source: {node: distance}}. The searches are
+        run batch_size sources at a time by CompiledNetwork.map_distances_from.
+        """
+        return self.compile().map_distances_from(sources, batch_size=batch_size)
 
     def map_ac2(self):
         """
@@ -206,72 +427,1245 @@ class Network:
         where
         kv = number of nodes neighboring n
         nv = number of links between neighbors of n
+
+        Self-links are ignored.
         """
-        neighbors = self.find_neighbors(node)
+        net = self._net
+        neighbors = set(net[node])
+        neighbors.discard(node)
         kv = len(neighbors)
-        nv = 0
 
         if kv < 2:
             return 0
 
-        for i in range(kv-1):
-            for j in range(i+1, kv):
-                if neighbors[j] in self.find_neighbors(neighbors[i]):
+        # Each link between neighbors is counted from both ends; a neighbor's
+        # self-link would make it its own common neighbor, so it is taken off
+        nv2 = sum(len(neighbors.intersection(net[nbor])) - (nbor in net[nbor])
+                  for nbor in neighbors)
+        return 1.0*nv2/(kv*(kv-1))
+
+    def triangle_count(self):
+        """
+        Map the number of triangles (closed triples) through each node.
+
+        Uses degree-ordered enumeration: each link is oriented from its
+        lower-degree end to its higher-degree end, and triangles are found
+        by intersecting out-neighbor sets, in O(E^1.5). Self-links are ignored.
+        """
+        return _count_triangles(self._net, lambda node: self._net[node])
+
+    def map_cc(self):
+        """
+        Map the clustering coefficient (cc) of every node, as compute_node_cc.
+
+        Self-links are ignored.
+        """
+        return _map_cc(self.triangle_count(), lambda node: self._net[node])
+
+    def average_cc(self):
+        """Return the average clustering coefficient of the nodes."""
+        cc_map = self.map_cc()
+        return float(sum(cc_map.values())/len(cc_map))
+
+    def transitivity(self):
+        """
+        Return the global clustering coefficient (transitivity).
+
+        transitivity = 3 * triangles / connected triples
+        """
+        return _transitivity(self.triangle_count(), lambda node: self._net[node])
+
+    def map_weighted_distance_to_node(self, node, queue='binary'):
+        """
+        Map shortest weighted paths to a node using Djikstra algorithm.
+
+        Return a map of format {node: (shortest_path, number_of_hops)}.
+
+        queue -- priority queue used by Djikstra: 'binary', 'd-ary' or 'pairing'
+        """
+        # The hop counts of tied paths depend on the queue, so it is part of the key
+        return self._cached(node, ('weighted', queue),
+                            lambda node: self._djikstra(node, lambda x,y: x+y, queue))
+
+    def map_lowest_peak_to_node(self, node, queue='binary'):
+        """
+        Map the paths to node minizing the weight of the heaviest link on the path.
+
+        Return the weight of the heaviest link for each reachable node.
+
+        queue -- priority queue used by Djikstra: 'binary', 'd-ary' or 'pairing'
+        """
+        return self._cached(node, ('peak', queue),
+                            lambda node: self._djikstra(node, lambda x,y: max(x,y), queue))
+
+    def _djikstra(self, node, func_new_dist, queue='binary'):
+        dist_so_far = _priority_queue(queue, (node, 0, 0))
+        final_dist = {}
+        while len(dist_so_far) > 0:
+            current, dist, hops = dist_so_far.pop()
+            final_dist[current] = (dist, hops)
+
+            for nbor, weight in self._net[current].items():
+                if nbor not in final_dist:
+                    new_dist = func_new_dist(dist, weight)
+                    if dist_so_far.contains(nbor):
+                        dist_so_far.decrease_key((nbor, new_dist, hops + 1))
+                    else:
+                        dist_so_far.insert((nbor, new_dist, hops + 1))
+
+        return final_dist
+
+    def map_weighted_distances(self, lowest_peak=False, method='auto', queue='binary'):
+        """
+        Map shortest weighted paths between all pairs of nodes.
+
+        See CompiledNetwork.map_weighted_distances.
+        """
+        return self.compile().map_weighted_distances(lowest_peak=lowest_peak, method=method,
+                                                     queue=queue)
+
+    def shortest_path(self, node1, node2, weighted=False, heuristic=None):
+        """
+        Find a shortest path from node1 to node2.
+
+        Searches from both ends at once and stops as soon as the path is
+        known, instead of mapping the whole component.
+
+        Keyword arguments:
+        weighted -- if True, minimize the sum of link weights (bidirectional
+                    Djikstra), else the number of hops (bidirectional BFS)
+        heuristic -- (optional) function heuristic(node, node2) giving a lower
+                     bound of the weight from node to node2. If given, run
+                     an A* search from node1 instead; weighted is implied.
+
+        Return (path, cost), where path is the list of nodes from node1 to
+        node2; (None, float('inf')) if node2 can't be reached.
+        """
+        if heuristic is not None:
+            return self._astar(node1, node2, heuristic)
+        if weighted:
+            return self._bidirectional_djikstra(node1, node2)
+        return self._bidirectional_bfs(node1, node2)
+
+    def _bidirectional_bfs(self, node1, node2):
+        net = self._net
+        parents = ({node1: None}, {node2: None})
+        depths = ({node1: 0}, {node2: 0})
+        frontiers = ([node1], [node2])
+        best = (float('inf'), None, None)
+        if node1 == node2:
+            return ([node1], 0)
+
+        while frontiers[0] and frontiers[1]:
+            # Expand the smaller frontier by one full level
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parent_of, depth_of = parents[side], depths[side]
+            other_depth_of = depths[1-side]
+            next_frontier = []
+            for current in frontiers[side]:
+                depth = depth_of[current] + 1
+                for nbor in net[current]:
+                    if nbor in other_depth_of:
+                        hops = depth + other_depth_of[nbor]
+                        if hops < best[0]:
+                            best = (hops, current, nbor) if side == 0 else (hops, nbor, current)
+                    if nbor not in depth_of:
+                        depth_of[nbor] = depth
+                        parent_of[nbor] = current
+                        next_frontier.append(nbor)
+            if best[1] is not None:
+                return (_join_paths(parents, best[1], best[2]), best[0])
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+
+        return (None, float('inf'))
+
+    def _bidirectional_djikstra(self, node1, node2):
+        net = self._net
+        queues = (jbh.IndexedHeap(0, 1, elements=[(node1, 0)]),
+                  jbh.IndexedHeap(0, 1, elements=[(node2, 0)]))
+        dists = ({node1: 0}, {node2: 0})
+        parents = ({node1: None}, {node2: None})
+        settled = (set(), set())
+        best = (float('inf'), None, None)
+        if node1 == node2:
+            return ([node1], 0)
+
+        while len(queues[0]) > 0 and len(queues[1]) > 0:
+            if queues[0].peek()[1] + queues[1].peek()[1] >= best[0]:
+                break
+            side = 0 if queues[0].peek()[1] <= queues[1].peek()[1] else 1
+            queue, dist_of, parent_of = queues[side], dists[side], parents[side]
+            other_dist_of = dists[1-side]
+
+            current, dist = queue.pop()
+            settled[side].add(current)
+            for nbor, weight in net[current].items():
+                if nbor in settled[side]:
+                    continue
+                new_dist = dist + weight
+                if nbor not in dist_of or new_dist < dist_of[nbor]:
+                    dist_of[nbor] = new_dist
+                    parent_of[nbor] = current
+                    queue.update((nbor, new_dist))
+                if nbor in other_dist_of:
+                    cost = dist_of[nbor] + other_dist_of[nbor]
+                    if cost < best[0]:
+                        best = (cost, nbor, nbor)
+
+        if best[1] is None:
+            return (None, float('inf'))
+        return (_join_paths(parents, best[1], best[2]), best[0])
+
+    def _astar(self, node1, node2, heuristic):
+        # A node is searched again whenever a shorter path to it is found, even
+        # after it was popped, so the result is optimal for any lower bound
+        # (admissible heuristic), not only for consistent ones.
+        net = self._net
+        queue = jbh.IndexedHeap(0, 1, elements=[(node1, heuristic(node1, node2), 0)])
+        parent_of = {node1: None}
+        dist_of = {node1: 0}
+
+        while len(queue) > 0:
+            current, _, dist = queue.pop()
+            if current == node2:
+                return (_join_paths((parent_of, {node2: None}), node2, node2), dist)
+            for nbor, weight in net[current].items():
+                new_dist = dist + weight
+                if nbor in dist_of and new_dist >= dist_of[nbor]:
+                    continue
+                dist_of[nbor] = new_dist
+                parent_of[nbor] = current
+                queue.update((nbor, new_dist + heuristic(nbor, node2), new_dist))
+
+        return (None, float('inf'))
+
+    def minimum_spanning_tree(self):
+        """
+        Return the minimum spanning tree of the network, as a Network.
+
+        Uses Kruskal's algorithm. If the network is not connected, the
+        result is a minimum spanning forest, with every node included.
+        """
+        index = {node: i for i, node in enumerate(self._net)}
+        links = [(weight, node1, node2)
+                 for node1 in self._net
+                 for node2, weight in self._net[node1].items()
+                 if index[node1] < index[node2]]
+        return _kruskal(self._net, links)
+
+    def estimate_node_cc(self, node, samples=None, epsilon=0.05, delta=0.05, seed=None):
+        """
+        Estimate the clustering coefficient (cc) of node by wedge sampling.
+
+        Pairs of neighbors of node are drawn at random; cc is the fraction
+        of pairs that are linked. If there are no more pairs than samples,
+        cc is computed exactly.
+
+        Keyword arguments:
+        samples -- number of pairs to draw. By default, enough for epsilon and delta.
+        epsilon, delta -- the true cc is within epsilon of the estimate
+                          with probability at least 1 - delta
+        seed -- seed for the random number generator
+
+        Return (estimate, (low, high)), where (low, high) is the
+        1 - delta confidence interval.
+        """
+        rng = random.Random(seed)
+        samples = _hoeffding_samples(samples, epsilon, delta)
+        neighbors = [nbor for nbor in self._net[node] if nbor != node]
+        kv = len(neighbors)
+
+        if kv*(kv-1)//2 <= samples:
+            cc = self.compute_node_cc(node) if kv >= 2 else 0.0
+            return (cc, (cc, cc))
+
+        hits = 0
+        for _ in range(samples):
+            nbor1, nbor2 = rng.sample(neighbors, 2)
+            if nbor2 in self._net[nbor1]:
+                hits += 1
+        return _hoeffding_interval(hits/samples, samples, delta, 1.0)
+
+    def estimate_cc(self, samples=None, epsilon=0.05, delta=0.05, seed=None):
+        """
+        Estimate the average clustering coefficient, as average_cc, by wedge sampling.
+
+        Each sample draws a node at random, then a random pair of its
+        neighbors, and checks if the pair is linked.
+
+        Keyword arguments: as estimate_node_cc.
+
+        Return (estimate, (low, high)), where (low, high) is the
+        1 - delta confidence interval.
+        """
+        rng = random.Random(seed)
+        samples = _hoeffding_samples(samples, epsilon, delta)
+        nodes = self.nodes
+
+        hits = 0
+        for _ in range(samples):
+            node = nodes[rng.randrange(len(nodes))]
+            neighbors = [nbor for nbor in self._net[node] if nbor != node]
+            if len(neighbors) >= 2:
+                nbor1, nbor2 = rng.sample(neighbors, 2)
+                if nbor2 in self._net[nbor1]:
+                    hits += 1
+        return _hoeffding_interval(hits/samples, samples, delta, 1.0)
+
+    def estimate_ac(self, nodes='all', samples=None, epsilon=0.05, delta=0.05, seed=None):
+        """
+        Estimate the centrality (average distance) of nodes, as map_ac, by pivot sampling.
+
+        In each component, a BFS is run from a number of pivot nodes drawn
+        at random without replacement; the centrality of a node is
+        estimated as its average distance to the pivots. If a component
+        has no more nodes (or nodes to map) than pivots, its centralities
+        are computed exactly instead.
+
+        Keyword arguments:
+        nodes -- (optional) list of nodes to map. By default, map all nodes.
+        samples -- number of pivots per component. By default, enough for epsilon and delta.
+        epsilon -- error target, as a fraction of the component's distance range
+        delta -- each estimate is within its interval with probability
+                 at least 1 - delta
+        seed -- seed for the random number generator
+
+        The distance range of a component is bounded by twice the
+        eccentricity of any of its nodes; the smallest bound among the
+        pivots is used.
+
+        Return a map of format {node: (estimate, (low, high))}.
+        """
+        rng = random.Random(seed)
+        samples = _hoeffding_samples(samples, epsilon, delta)
+        if nodes == 'all':
+            nodes = self.nodes
+            compiled = self.compile()
+        else:
+            nodes = list(nodes)
+            compiled = self.compile_components(nodes)
+        requested = set(nodes)
+
+        acmap = {}
+        for component in compiled.connected_components():
+            targets = [node for node in component if node in requested]
+            if not targets:
+                continue
+            if len(targets) <= samples or len(component) <= samples:
+                for node, ac in compiled.map_ac(nodes=targets).items():
+                    acmap[node] = (ac, (ac, ac))
+                continue
+
+            pivots = rng.sample(component, samples)
+            totals = dict.fromkeys(targets, 0)
+            dist_range = float('inf')
+            for i in range(0, len(pivots), 64):
+                dist_maps = compiled.map_distances_from(pivots[i:i+64])
+                for dist_map in dist_maps.values():
+                    dist_range = min(dist_range, 2 * max(dist_map.values()))
+                    for node in totals:
+                        totals[node] += dist_map[node]
+
+            for node, total in totals.items():
+                acmap[node] = _hoeffding_interval(total/samples, samples, delta, dist_range)
+        return acmap
+
+
+def _centrality(traversal):
+    """Return the average depth of the nodes of a traversal."""
+    total = 0
+    reached = 0
+    for _, depth, _ in traversal:
+        total += depth
+        reached += 1
+    return float(total/reached)
+
+
+def _connected_components(network):
+    components = []
+    seen = set()
+    for node in network.nodes:
+        if node not in seen:
+            component = [current for current, _, _ in network.traverse(node)]
+            seen.update(component)
+            components.append(component)
+    return components
+
+
+class _DistanceCache:
+    """
+    LRU cache of distance maps, keyed by (source, metric).
+
+    Each map is stored with the network version it was computed at, and
+    is only returned for that same version. The budget is the total number
+    of entries of the cached maps; least recently used maps are evicted first.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = 0
+        self._maps = OrderedDict()
+
+    def get(self, key, version):
+        """Return the map cached for key at version, None if there is none."""
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == version:
+            self._maps.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        if cached is not None:
+            self._discard(key)
+        self.misses += 1
+        return None
+
+    def put(self, key, version, dist_map):
+        if key in self._maps:
+            self._discard(key)
+        if len(dist_map) > self.max_entries:
+            return
+        while self._entries + len(dist_map) > self.max_entries:
+            self._discard(next(iter(self._maps)))
+        self._maps[key] = (version, dist_map)
+        self._entries += len(dist_map)
+
+    def _discard(self, key):
+        _, dist_map = self._maps.pop(key)
+        self._entries -= len(dist_map)
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'maps': len(self._maps),
+                'entries': self._entries, 'max_entries': self.max_entries}
+
+
+def _join_paths(parents, meet1, meet2):
+    """
+    Join the paths of a bidirectional search meeting at the link meet1-meet2.
+
+    parents is a pair of {node: parent} maps, from the start and from the
+    end; meet1 is in the first, meet2 in the second (they can be the same node).
+    """
+    path = []
+    node = meet1
+    while node is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    node = parents[1][meet2] if meet1 == meet2 else meet2
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    return path
+
+
+class _DisjointSet:
+    """Union-find over hashable items, with path halving and union by size."""
+    def __init__(self, items):
+        self._parent = {item: item for item in items}
+        self._size = dict.fromkeys(self._parent, 1)
+
+    def find(self, item):
+        parent = self._parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, item1, item2):
+        """Merge the sets of item1 and item2. Return False if already merged."""
+        root1 = self.find(item1)
+        root2 = self.find(item2)
+        if root1 == root2:
+            return False
+        if self._size[root1] < self._size[root2]:
+            root1, root2 = root2, root1
+        self._parent[root2] = root1
+        self._size[root1] += self._size[root2]
+        return True
+
+
+def _kruskal(nodes, links):
+    """Return the minimum spanning forest of nodes and (weight, node1, node2) links."""
+    tree = Network()
+    for node in nodes:
+        tree.add_node(node)
+    components = _DisjointSet(nodes)
+    for weight, node1, node2 in sorted(links, key=lambda link: link[0]):
+        if components.union(node1, node2):
+            tree.add_link(node1, node2, weight=weight)
+    return tree
+
+
+def _hoeffding_samples(samples, epsilon, delta):
+    """Number of samples for error epsilon with probability 1 - delta (Hoeffding)."""
+    if samples is not None:
+        if samples < 1:
+            raise ValueError('samples must be at least 1, not {}'.format(samples))
+        return samples
+    return math.ceil(math.log(2/delta) / (2*epsilon**2))
+
+
+def _hoeffding_interval(estimate, samples, delta, value_range):
+    """Return (estimate, (low, high)) for the mean of samples in [0, value_range]."""
+    half_width = value_range * math.sqrt(math.log(2/delta) / (2*samples))
+    return (estimate, (max(0.0, estimate - half_width), min(value_range, estimate + half_width)))
+
+
+def _degree(node, neighbors):
+    """Degree of node, not counting a self-link."""
+    return len(neighbors) - (node in neighbors)
+
+
+def _count_triangles(nodes, neighbors_of):
+    """
+    Map the number of triangles through each node.
+
+    neighbors_of(node) must return a sized collection of the node's neighbors.
+    """
+    nodes = list(nodes)
+    rank = {node: i for i, node in enumerate(
+        sorted(nodes, key=lambda node: len(neighbors_of(node))))}
+    higher = {}
+    for node in nodes:
+        node_rank = rank[node]
+        higher[node] = {nbor for nbor in neighbors_of(node) if rank[nbor] > node_rank}
+
+    triangles = dict.fromkeys(nodes, 0)
+    for node in nodes:
+        node_higher = higher[node]
+        for nbor in node_higher:
+            common = node_higher & higher[nbor]
+            if common:
+                triangles[node] += len(common)
+                triangles[nbor] += len(common)
+                for third in common:
+                    triangles[third] += 1
+    return triangles
+
+
+def _map_cc(triangles, neighbors_of):
+    cc_map = {}
+    for node, count in triangles.items():
+        kv = _degree(node, neighbors_of(node))
+        cc_map[node] = 2.0*count/(kv*(kv-1)) if kv >= 2 else 0
+    return cc_map
+
+
+def _transitivity(triangles, neighbors_of):
+    triples = 0
+    for node in triangles:
+        kv = _degree(node, neighbors_of(node))
+        triples += kv*(kv-1)//2
+    if triples == 0:
+        return 0.0
+    return float(sum(triangles.values())/triples)
+
+
+def _open_text(path):
+    """Open a text file for reading, decompressing it if its name ends in .gz."""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, 'r', newline='')
+
+
+def read_edges(paths, delim=None, weighted=False, node_type=str, weight_type=float,
+               comment='#'):
+    """
+    Stream links from one or more edge-list files.
+
+    Each line holds node1, node2 and, if weighted is True, a weight.
+    Files ending in .gz are decompressed on the fly. Blank lines and lines
+    starting with comment (unless it is None) are skipped. The files are read a buffer at a
+    time, never whole.
+
+    Arguments:
+    paths -- a file path, or a list of file paths
+    delim -- field delimiter, e.g. ',' for CSV or '\\t' for TSV (parsed
+             with the csv module); None splits on whitespace
+    weighted -- read a weight in the third column
+    node_type -- function converting node labels, e.g. int. String
+                 labels are interned, so repeated labels share one object.
+    weight_type -- function converting weights
+
+    Yield (node1, node2) or (node1, node2, weight) tuples.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    if node_type is str:
+        node_type = sys.intern
+
+    for path in paths:
+        with _open_text(path) as edge_file:
+            if delim is None:
+                rows = (line.split() for line in edge_file)
+            else:
+                rows = csv.reader(edge_file, delimiter=delim)
+            for row in rows:
+                if not row or (comment is not None and row[0].startswith(comment)):
+                    continue
+                if weighted:
+                    yield (node_type(row[0]), node_type(row[1]), weight_type(row[2]))
+                else:
+                    yield (node_type(row[0]), node_type(row[1]))
+
+
+# Average number of nodes per BFS level below which CompiledNetwork.map_ac
+# searches one source at a time (measured crossover: about 20 to 30)
+_MIN_LEVEL_WIDTH = 32
+
+
+# Priority queues for Djikstra, by name
+_QUEUES = {
+    'binary': jbh.IndexedHeap,
+    'd-ary': jbh.DAryHeap,
+    'pairing': jbh.PairingHeap,
+}
+
+
+def _priority_queue(queue, element):
+    """Return a new priority queue of kind queue (see _QUEUES) holding element."""
+    try:
+        queue_class = _QUEUES[queue]
+    except KeyError:
+        raise ValueError('Unknown queue: {}'.format(queue)) from None
+    return queue_class(0, 1, elements=[element])
+
+
+# Object shared with the worker processes of _worker_pool
+_shared = None
+
+
+def _init_worker(shared):
+    # pylint: disable=global-statement
+    global _shared
+    _shared = shared
+
+
+def _worker_pool(workers, shared):
+    """
+    Return a ProcessPoolExecutor of workers processes sharing shared.
+
+    shared is handed to each worker once, when the worker starts, and
+    read back with _shared_state(). With the fork start method it is
+    inherited, not pickled at all.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                               initializer=_init_worker, initargs=(shared,))
+
+
+def _shared_state():
+    """Return the object shared with this worker process (see _worker_pool)."""
+    return _shared
+
+
+def _map_ac_chunk(nodes):
+    acmap = _shared_state().map_ac(nodes=nodes)
+    return [acmap[node] for node in nodes]
+
+
+def _map_ac_parallel(network, nodes, workers):
+    """Map centrality of nodes using a pool of worker processes (see _worker_pool)."""
+    nodes = list(nodes)
+    chunk_size = max(1, len(nodes) // (workers * 4))
+    chunks = [nodes[i:i+chunk_size] for i in range(0, len(nodes), chunk_size)]
+
+    with _worker_pool(workers, network) as pool:
+        acmap = {}
+        for chunk, centralities in zip(chunks, pool.map(_map_ac_chunk, chunks)):
+            acmap.update(zip(chunk, centralities))
+    return acmap
+
+
+class CompiledNetwork:
+    """
+    A frozen network in compressed sparse row (CSR) form.
+
+    Nodes are interned to integer ids 0..n-1. The neighbors of node i are
+    neighbors[offsets[i]:offsets[i+1]] (sorted by id), with the matching
+    link weights in weights. Algorithms run on the integer ids and only
+    translate back to node labels in their results.
+
+    Create with Network.compile().
+
+    Methods:
+    link_weight -- get weight of link between two nodes
+    find_neighbors -- get neighbors (linked nodes) of node
+    iter_neighbors -- iterate over neighbors of node without copying them
+    traverse -- breadth-first traversal from a node
+    connected_components -- list the connected components of the network
+    map_distance_to_node -- map lengths of shortest paths to a node
+    map_weighted_distance_to_node -- map weights of lightest paths to a node
+    map_lowest_peak_to_node -- map lowest peaks of paths to a node
+    map_weighted_distances -- matrix of weights of lightest paths between all nodes
+    minimum_spanning_tree -- minimum spanning tree (forest) of the network
+    compute_node_centrality -- compute centrality (average distance) of a node
+    compute_node_cc -- compute clustering coefficient of a node
+    triangle_count -- map number of triangles through each node
+    map_cc -- map clustering coefficient for all nodes
+    average_cc -- average clustering coefficient
+    transitivity -- global clustering coefficient (transitivity)
+    map_ac -- map centrality for all nodes
+    map_distances_from -- map lengths of shortest paths from many nodes at once
+    multi_bfs -- breadth-first search from up to 64 node ids at once
+    djikstra_ids -- Djikstra from a node id, on integer ids
+    save -- save the network in binary form
+    load -- (class method) load a network saved with save
+
+    Properties:
+    nodes -- list of nodes in the network
+    node_count -- number of nodes in the network
+    link_count -- number of links in the network
+    bridge_links -- links that are the only path between two components
+    csr -- (node_ids, offsets, neighbors, weights) arrays
+    """
+    # Binary format: header, then offsets (int64), neighbors (int64),
+    # weights (float64), then the pickled list of node labels.
+    # Header: magic, byte order, node count, neighbors length, node table size.
+    _MAGIC = b'JBNETCSR'
+    _HEADER = struct.Struct('<8s8sqqq')
+    _HEADER_SIZE = 64
+
+    def __init__(self, node_ids, offsets, neighbors, weights):
+        """
+        Arguments
+        node_ids -- list of node labels, indexed by id
+        offsets -- array of n+1 row offsets into neighbors
+        neighbors -- array of neighbor ids
+        weights -- array of link weights, parallel to neighbors
+        """
+        self._ids = node_ids
+        self._index = {node: i for i, node in enumerate(node_ids)}
+        self._offsets = offsets
+        self._neighbors = neighbors
+        self._weights = weights
+        self._rstree = None
+        self._self_links = None
+        # Path of the file the arrays are mapped from, if any
+        self._mapped_path = None
+
+    def __len__(self):
+        return self.node_count
+
+    def save(self, path):
+        """
+        Save the network in binary form, to be loaded with load.
+
+        The arrays are written as they are in memory (native byte order),
+        8-byte aligned, so they can be mapped without copying.
+        """
+        table = pickle.dumps(list(self._ids), protocol=pickle.HIGHEST_PROTOCOL)
+        header = self._HEADER.pack(self._MAGIC, sys.byteorder.encode(), len(self._ids),
+                                   len(self._neighbors), len(table))
+        with open(path, 'wb') as out:
+            out.write(header.ljust(self._HEADER_SIZE, b'\0'))
+            for arr in (self._offsets, self._neighbors, self._weights):
+                out.write(arr.tobytes())
+            out.write(table)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a network saved with save.
+
+        If mmap is True, the offset, neighbor and weight arrays are not read:
+        they are views on the memory-mapped file, so loading is instant and
+        processes loading the same file share its pages. Otherwise they
+        are read into arrays.
+
+        The node labels are unpickled: only load files you trust.
+        """
+        with open(path, 'rb') as in_file:
+            header = in_file.read(cls._HEADER_SIZE)
+            magic, byteorder, n, m, table_size = cls._HEADER.unpack_from(header)
+            if magic != cls._MAGIC:
+                raise ValueError('Not a binary network file: {}'.format(path))
+            swap = byteorder.rstrip(b'\0').decode() != sys.byteorder
+
+            start = cls._HEADER_SIZE
+            sizes = [('q', n + 1), ('q', m), ('d', m)]
+            table_start = start + 8 * (n + 1 + 2*m)
+
+            if mmap and not swap:
+                buffer = memoryview(mm.mmap(in_file.fileno(), 0, access=mm.ACCESS_READ))
+                arrays = []
+                for typecode, length in sizes:
+                    arrays.append(buffer[start:start + 8*length].cast(typecode))
+                    start += 8*length
+                node_ids = pickle.loads(buffer[table_start:table_start + table_size])
+            else:
+                arrays = []
+                for typecode, length in sizes:
+                    arr = array(typecode)
+                    arr.frombytes(in_file.read(8*length))
+                    if swap:
+                        arr.byteswap()
+                    arrays.append(arr)
+                node_ids = pickle.loads(in_file.read(table_size))
+
+        network = cls(node_ids, *arrays)
+        if mmap and not swap:
+            network._mapped_path = path
+        return network
+
+    def __getstate__(self):
+        # A memory-mapped network is sent to other processes as its path,
+        # so they map the same file instead of receiving copies
+        if self._mapped_path is not None:
+            return {'_mapped_path': self._mapped_path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if '_offsets' not in state:
+            state = CompiledNetwork.load(state['_mapped_path']).__dict__
+        self.__dict__.update(state)
+
+    @property
+    def node_count(self):
+        """Number of nodes in the network."""
+        return len(self._ids)
+
+    @property
+    def link_count(self):
+        """Number of links in the network."""
+        if self._self_links is None:
+            # Self-links appear once in the adjacency, other links twice
+            offsets = self._offsets
+            neighbors = self._neighbors
+            self._self_links = sum(1 for i in range(len(self._ids))
+                                   if i in neighbors[offsets[i]:offsets[i+1]])
+        return (len(self._neighbors) + self._self_links) // 2
+
+    @property
+    def nodes(self):
+        """Nodes in the network."""
+        return list(self._ids)
+
+    @property
+    def bridge_links(self):
+        """Bridge links."""
+        if self._rstree is None:
+            self._rstree = RSTree(self, self._ids[0])
+        return self._rstree.bridge_links
+
+    @property
+    def csr(self):
+        """The (node_ids, offsets, neighbors, weights) arrays; read-only."""
+        return (self._ids, self._offsets, self._neighbors, self._weights)
+
+    def _row(self, i):
+        return range(self._offsets[i], self._offsets[i+1])
+
+    def link_weight(self, node1, node2):
+        i = self._index[node1]
+        j = self._index[node2]
+        for k in self._row(i):
+            if self._neighbors[k] == j:
+                return self._weights[k]
+        raise KeyError(node2)
+
+    def find_neighbors(self, node):
+        """Return list of neighbors of node."""
+        i = self._index[node]
+        ids = self._ids
+        return [ids[j] for j in self._neighbors[self._offsets[i]:self._offsets[i+1]]]
+
+    def iter_neighbors(self, node):
+        """Return an iterator over the neighbors of node."""
+        i = self._index[node]
+        return map(self._ids.__getitem__, self._neighbors[self._offsets[i]:self._offsets[i+1]])
+
+    def _traverse_ids(self, source):
+        """Yield (node_id, depth, parent_id) breadth-first from source id."""
+        offsets = self._offsets
+        neighbors = self._neighbors
+        depth_of = [-1] * len(self._ids)
+        depth_of[source] = 0
+        queue = deque([(source, -1)])
+        while queue:
+            current, parent = queue.popleft()
+            depth = depth_of[current]
+            yield current, depth, parent
+            for nbor in neighbors[offsets[current]:offsets[current+1]]:
+                if depth_of[nbor] < 0:
+                    depth_of[nbor] = depth + 1
+                    queue.append((nbor, current))
+
+    def traverse(self, node):
+        """
+        Traverse the component of node breadth-first.
+
+        Yield (node, depth, parent) for every reachable node, starting
+        with (node, 0, None).
+        """
+        ids = self._ids
+        for current, depth, parent in self._traverse_ids(self._index[node]):
+            yield ids[current], depth, (ids[parent] if parent >= 0 else None)
+
+    def connected_components(self):
+        """Return the connected components of the network, as lists of nodes."""
+        return _connected_components(self)
+
+    def map_distance_to_node(self, node):
+        """Map the distance between node n and every reachable node in the graph."""
+        ids = self._ids
+        return {ids[current]: depth for current, depth, _ in self._traverse_ids(self._index[node])}
+
+    def compute_node_centrality(self, node):
+        """Return the average distance from node to all other reachable nodes."""
+        return _centrality(self._traverse_ids(self._index[node]))
+
+    def map_ac(self, nodes='all', workers=None):
+        """
+        Map the average centrality of nodes in the graph.
+
+        Keyword arguments:
+        nodes -- (optional) list of nodes to map. By default, map all nodes.
+        workers -- (optional) number of worker processes. If more than 1, the
+                   source nodes are split across a process pool.
+
+        Sources are taken 64 at a time. The first one is searched alone;
+        if its BFS levels are wide, the others are searched together by
+        a multi-source BFS, which pays off when their frontiers overlap
+        (small-world graphs). On high-diameter graphs (rings, lattices)
+        the levels are narrow and one BFS per source is faster.
+        """
+        if nodes == 'all':
+            nodes = self.nodes
+
+        if workers is not None and workers > 1:
+            return _map_ac_parallel(self, nodes, workers)
+
+        nodes = list(nodes)
+        index = self._index
+        acmap = {}
+        for i in range(0, len(nodes), 64):
+            batch = nodes[i:i+64]
+            depths = [depth for _, depth, _ in self._traverse_ids(index[batch[0]])]
+            acmap[batch[0]] = float(sum(depths)/len(depths))
+            if len(depths) < _MIN_LEVEL_WIDTH * (max(depths) + 1):
+                for node in batch[1:]:
+                    acmap[node] = self.compute_node_centrality(node)
+            else:
+                totals, reached = self._multi_bfs_sums([index[node] for node in batch[1:]])
+                for node, total, count in zip(batch[1:], totals, reached):
+                    acmap[node] = float(total/count)
+        return acmap
+
+    def _multi_bfs_sums(self, source_ids):
+        """
+        Return (sum of distances, number of reachable nodes) for each source.
+
+        The masks of each level are added up in bit-sliced counters
+        (planes[j] holds bit j of the count for every source), so the
+        per-source totals are only unpacked once per level.
+        """
+        totals = [0] * len(source_ids)
+        reached = [0] * len(source_ids)
+
+        def _unpack(planes, depth):
+            for j, plane in enumerate(planes):
+                count = 1 << j
+                while plane:
+                    low = plane & -plane
+                    bit = low.bit_length() - 1
+                    totals[bit] += count * depth
+                    reached[bit] += count
+                    plane ^= low
+
+        planes = []
+        level = 0
+        for depth, _, mask in self.multi_bfs(source_ids):
+            if depth != level:
+                _unpack(planes, level)
+                planes = []
+                level = depth
+            # Ripple-carry add mask to the counters
+            j = 0
+            while mask:
+                if j == len(planes):
+                    planes.append(mask)
+                    break
+                plane = planes[j]
+                planes[j] = plane ^ mask
+                mask &= plane
+                j += 1
+        _unpack(planes, level)
+        return (totals, reached)
+
+    def map_distances_from(self, sources, batch_size=64):
+        """
+        Map the distance between each source and every node reachable from it.
+
+        Return a map of format {source: {node: distance}}.
+
+        Sources are searched batch_size at a time: every source in a batch
+        is a bit in an integer bitset, so each link is scanned once per
+        level for the whole batch instead of once per source.
+        """
+        sources = list(sources)
+        ids = self._ids
+        index = self._index
+        dist_maps = {source: {} for source in sources}
+        for i in range(0, len(sources), batch_size):
+            batch = sources[i:i+batch_size]
+            batch_maps = [dist_maps[source] for source in batch]
+            for depth, node_id, mask in self.multi_bfs([index[source] for source in batch]):
+                node = ids[node_id]
+                while mask:
+                    low = mask & -mask
+                    batch_maps[low.bit_length() - 1][node] = depth
+                    mask ^= low
+        return dist_maps
+
+    def multi_bfs(self, source_ids):
+        """
+        Breadth-first search from several sources at once (MS-BFS).
+
+        Bit k of a mask stands for source_ids[k]. Yield (depth, node_id, mask)
+        for every node, level by level, where mask holds the sources that
+        reach node_id for the first time at that depth.
+
+        The cost is proportional to the size of the sources' components.
+        """
+        offsets = self._offsets
+        neighbors = self._neighbors
+        seen = {}
+        frontier = {}
+        for bit, source in enumerate(source_ids):
+            seen[source] = seen.get(source, 0) | 1 << bit
+            frontier[source] = frontier.get(source, 0) | 1 << bit
+
+        depth = 0
+        while frontier:
+            for node_id, mask in frontier.items():
+                yield depth, node_id, mask
+
+            depth += 1
+            next_frontier = {}
+            for node_id, mask in frontier.items():
+                for nbor in neighbors[offsets[node_id]:offsets[node_id+1]]:
+                    old = seen.get(nbor, 0)
+                    new = mask & ~old
+                    if new:
+                        seen[nbor] = old | new
+                        next_frontier[nbor] = next_frontier.get(nbor, 0) | new
+            frontier = next_frontier
+
+    # pylint: disable=invalid-name
+    def compute_node_cc(self, node):
+        """Compute connectivity coefficient (cc) of node n.
+
+        cc = 2 * nv / kv(kv-1)
+
+        where
+        kv = number of nodes neighboring n
+        nv = number of links between neighbors of n
+
+        Self-links are ignored.
+        """
+        offsets = self._offsets
+        neighbors = self._neighbors
+        i = self._index[node]
+        nbors = set(neighbors[offsets[i]:offsets[i+1]])
+        nbors.discard(i)
+        kv = len(nbors)
+
+        if kv < 2:
+            return 0
+
+        nv = 0
+        for j in nbors:
+            for nbor in neighbors[offsets[j]:offsets[j+1]]:
+                if nbor in nbors and nbor != j:
                     nv += 1
 
-        return 2.0*nv/(kv*(kv-1))
+        # Each link between neighbors was counted from both ends
+        return 1.0*nv/(kv*(kv-1))
+
+    def _row_of(self, i):
+        return self._neighbors[self._offsets[i]:self._offsets[i+1]]
+
+    def triangle_count(self):
+        """
+        Map the number of triangles (closed triples) through each node.
 
-    def map_weighted_distance_to_node(self, node):
+        See Network.triangle_count.
+        """
+        ids = self._ids
+        triangles = _count_triangles(range(len(ids)), self._row_of)
+        return {ids[i]: count for i, count in triangles.items()}
+
+    def map_cc(self):
+        """Map the clustering coefficient (cc) of every node. See Network.map_cc."""
+        ids = self._ids
+        cc_map = _map_cc(_count_triangles(range(len(ids)), self._row_of), self._row_of)
+        return {ids[i]: cc for i, cc in cc_map.items()}
+
+    def average_cc(self):
+        """Return the average clustering coefficient of the nodes."""
+        cc_map = self.map_cc()
+        return float(sum(cc_map.values())/len(cc_map))
+
+    def transitivity(self):
+        """Return the global clustering coefficient (transitivity)."""
+        return _transitivity(_count_triangles(range(len(self._ids)), self._row_of), self._row_of)
+
+    def map_weighted_distance_to_node(self, node, queue='binary'):
         """
         Map shortest weighted paths to a node using Djikstra algorithm.
 
         Return a map of format {node: (shortest_path, number_of_hops)}.
+
+        queue -- priority queue used by Djikstra: 'binary', 'd-ary' or 'pairing'
         """
-        return self._djikstra(node, lambda x,y: x+y)
+        return self._djikstra(node, lambda x,y: x+y, queue)
 
-    def map_lowest_peak_to_node(self, node):
+    def map_lowest_peak_to_node(self, node, queue='binary'):
         """
         Map the paths to node minizing the weight of the heaviest link on the path.
 
         Return the weight of the heaviest link for each reachable node.
+
+        queue -- priority queue used by Djikstra: 'binary', 'd-ary' or 'pairing'
+        """
+        return self._djikstra(node, lambda x,y: max(x,y), queue)
+
+    def _djikstra(self, node, func_new_dist, queue='binary'):
+        ids = self._ids
+        final_dist = self.djikstra_ids(self._index[node], func_new_dist, queue)
+        return {ids[i]: dist for i, dist in final_dist.items()}
+
+    def djikstra_ids(self, source, func_new_dist, queue='binary'):
         """
-        return self._djikstra(node, lambda x,y: max(x,y))
+        Djikstra from node id source, combining path length and link weight
+        with func_new_dist (e.g. lambda x,y: x+y).
 
-    def _djikstra(self, node, func_new_dist):
-        dist_so_far = jbh.HeapOfTuples(1, elements=[(node, 0, 0)])
+        Return {node_id: (dist, hops)} for the nodes reachable from source.
+        The cost is proportional to the size of source's component.
+        """
+        offsets = self._offsets
+        neighbors = self._neighbors
+        weights = self._weights
+        dist_so_far = _priority_queue(queue, (source, 0, 0))
         final_dist = {}
         while len(dist_so_far) > 0:
             current, dist, hops = dist_so_far.pop()
             final_dist[current] = (dist, hops)
 
-            for nbor in self.find_neighbors(current):
+            start, end = offsets[current], offsets[current+1]
+            for nbor, weight in zip(neighbors[start:end], weights[start:end]):
                 if nbor not in final_dist:
-                    dist_so_far_list = dist_so_far.list()
-                    new_dist = func_new_dist(final_dist[current][0], self.link_weight(current, nbor))
-                    new_hops = final_dist[current][1] + 1
-                    try:
-                        # This is relying on implementation details of
-                        # jbheap - need to add interface to do this
-                        i_x = [n[0] for n in dist_so_far_list].index(nbor)
-                        if new_dist < dist_so_far_list[i_x][1]:
-                            dist_so_far._heap[i_x] = (nbor, new_dist, new_hops)
-                            dist_so_far._up_heapify(i_x)
-                    except ValueError:
-                        dist_so_far.insert((nbor, new_dist, new_hops))
+                    new_dist = func_new_dist(dist, weight)
+                    if dist_so_far.contains(nbor):
+                        dist_so_far.decrease_key((nbor, new_dist, hops + 1))
+                    else:
+                        dist_so_far.insert((nbor, new_dist, hops + 1))
 
         return final_dist
 
-    # def map_weighted_distances(self):
-    #     """
-    #     Map shortest weighted paths between all pairs of nodes using Floyd-Warshall algorithm.
-    #     """
-    #     pass
+    def map_weighted_distances(self, lowest_peak=False, method='auto', queue='binary'):
+        """
+        Map shortest weighted paths between all pairs of nodes.
+
+        Keyword arguments:
+        lowest_peak -- if True, map the weight of the heaviest link on the
+                       path minimizing it (as map_lowest_peak_to_node),
+                       instead of the sum of the weights
+        method -- 'floyd-warshall', 'djikstra' (from every node),
+                  'spanning-tree' (lowest_peak only), or 'auto'.
+                  'auto' maps lowest peaks on the minimum spanning tree
+                  (see BottleneckTree). For sums, it chooses by density:
+                  Floyd-Warshall's row operations win when about three
+                  quarters or more of all pairs are linked, Djikstra
+                  otherwise.
+        queue -- priority queue used by Djikstra: 'binary', 'd-ary' or 'pairing'
+
+        Return (nodes, matrix), where matrix[i][j] is the distance from
+        nodes[i] to nodes[j] and matrix[i] is an array('d'). Unreachable
+        pairs are float('inf').
+
+        Raise ValueError if lowest_peak is False and a link has a negative
+        weight: links go both ways, so a negative link is a negative cycle
+        and shortest paths are not defined.
+        """
+        n = len(self._ids)
+        if not lowest_peak and len(self._weights) > 0 and min(self._weights) < 0:
+            raise ValueError('Negative link weight: shortest paths are not defined')
+        if method == 'auto' and lowest_peak:
+            method = 'spanning-tree'
+        if method == 'auto':
+            density = len(self._neighbors) / max(1, n*(n-1))
+            if density > 0.75:
+                method = 'floyd-warshall'
+            else:
+                method = 'djikstra'
+
+        if method == 'spanning-tree' and lowest_peak:
+            matrix = BottleneckTree(self).map_peaks()
+        elif method == 'floyd-warshall':
+            matrix = self._floyd_warshall(lowest_peak)
+        elif method == 'djikstra':
+            func_new_dist = (lambda x,y: max(x,y)) if lowest_peak else (lambda x,y: x+y)
+            matrix = []
+            for source in range(n):
+                row = array('d', [float('inf')]) * n
+                for i, (dist, _) in self.djikstra_ids(source, func_new_dist, queue).items():
+                    row[i] = dist
+                matrix.append(row)
+        else:
+            raise ValueError('Unknown method: {}'.format(method))
 
-    # def estimate_node_cc(self, node):
-    #     pass
+        return (list(self._ids), matrix)
 
-    # def estimate_cc(self):
-    #     pass
+    def minimum_spanning_tree(self):
+        """
+        Return the minimum spanning tree of the network, as a Network.
+
+        See Network.minimum_spanning_tree.
+        """
+        ids = self._ids
+        offsets = self._offsets
+        links = [(self._weights[k], ids[i], ids[self._neighbors[k]])
+                 for i in range(len(ids))
+                 for k in range(offsets[i], offsets[i+1])
+                 if i < self._neighbors[k]]
+        return _kruskal(ids, links)
+
+    def _floyd_warshall(self, lowest_peak):
+        """
+        Floyd-Warshall, relaxing a whole row at a time.
+
+        For each intermediate node k, row i is merged with row k in one
+        list comprehension instead of n separate index operations.
+        """
+        n = len(self._ids)
+        inf = float('inf')
+        matrix = []
+        for i in range(n):
+            row = [inf] * n
+            start, end = self._offsets[i], self._offsets[i+1]
+            for j, weight in zip(self._neighbors[start:end], self._weights[start:end]):
+                row[j] = min(row[j], weight)
+            row[i] = 0.0
+            matrix.append(row)
+
+        for k in range(n):
+            row_k = matrix[k]
+            for i in range(n):
+                row_i = matrix[i]
+                d_ik = row_i[k]
+                if d_ik == inf or i == k:
+                    continue
+                if lowest_peak:
+                    via_k = [d_ik if d_ik > d_kj else d_kj for d_kj in row_k]
+                else:
+                    via_k = [d_ik + d_kj for d_kj in row_k]
+                matrix[i] = [d_ikj if d_ikj < d_ij else d_ij for d_ij, d_ikj in zip(row_i, via_k)]
+        return [array('d', row) for row in matrix]
 
 
 # pylint: disable=too-many-instance-attributes
@@ -286,6 +1680,11 @@ class RSTree:
     max_po_map
     min_po_map
     bridge_links
+
+    Methods
+    add_link -- update the tree for a link added to the network
+    del_link -- update the tree for a link deleted from the network
+    del_node -- update the tree for a node deleted from the network
     """
     def __init__(self, network, root):
         """ Create a rooted spanning tree from a Network object."""
@@ -295,78 +1694,44 @@ class RSTree:
         self._max_po_map = None
         self._desc_map = None
         self._min_po_map = None
-        self._bridge_links = None
-
-        tree = {root:{}}
-        marked = [root]
-        open_list = [root]
-
-        def add_link(node1, node2, color):
-            """Add link to tree."""
-            if not node1 in tree:
-                tree[node1] = {}
-            if not node2 in tree:
-                tree[node2] = {}
-            tree[node1][node2] = color
-            if color == 'red':
-                tree[node2][node1] = 'red'
-
-        while open_list != []:
-            current = open_list.pop(0)
-            neighbors = network.find_neighbors(current)
-
-            for neighbor in neighbors:
-                if neighbor not in marked:
-                    marked.append(neighbor)
-                    open_list.append(neighbor)
-                    add_link(current, neighbor, 'green')
-                elif neighbor not in tree[current] and current not in tree[neighbor]:
-                    add_link(current, neighbor, 'red')
+        # {child: parent} for the tree links that are bridges
+        self._bridges = None
+
+        tree = {}
+        order = {}
+        parent_of = {}
+        depth_of = {}
+        for node, depth, parent in network.traverse(root):
+            order[node] = len(order)
+            depth_of[node] = depth
+            tree[node] = {}
+            if parent is not None:
+                tree[parent][node] = 'green'
+                parent_of[node] = parent
+
+        # Color each non-tree link once, from its end that was reached first
+        for node, rank in order.items():
+            for neighbor in network.iter_neighbors(node):
+                if order[neighbor] > rank and parent_of[neighbor] != node:
+                    tree[node][neighbor] = 'red'
+                    tree[neighbor][node] = 'red'
         self._tree = tree
+        self._parent = parent_of
+        self._depth = depth_of
 
     @property
     def po_map(self):
         """Rank of nodes in post-order traversal"""
-        if self._po_map is not None:
-            return self._po_map
-
-        _po_map = {}
-
-        # pylint: disable=missing-docstring
-        def _rec_post_order(current, k):
-            linked = self._tree[current]
-            children = [n for n in linked if linked[n] == 'green']
-            for child in children:
-                k = _rec_post_order(child, k)
-            _po_map[current] = k
-            return k+1
-
-        _rec_post_order(self.root, 1)
-        self._po_map = _po_map
-        return _po_map
+        if self._po_map is None:
+            self._compute_maps()
+        return self._po_map
 
     @property
     def desc_map(self):
         """Map of number of descendants of each node in the tree."""
-        if self._desc_map is not None:
-            return self._desc_map
-
-        _desc_map = {}
-
-        # pylint: disable=missing-docstring
-        def _how_many_below(current):
-            linked = self._tree[current]
-            children = [n for n in linked if linked[n] == 'green']
-
-            descendants = 1
-            for child in children:
-                descendants += _how_many_below(child)
-            _desc_map[current] = descendants
-            return descendants
-
-        _how_many_below(self.root)
-        self._desc_map = _desc_map
-        return _desc_map
+        if self._desc_map is None:
+            self._compute_maps()
+        return self._desc_map
 
     @property
     def max_po_map(self):
@@ -376,35 +1741,9 @@ class RSTree:
         Meaning, any rode reachable through tree edges and at most one
         non-tree edge.
         """
-        if self._max_po_map is not None:
-            return self._max_po_map
-
-        _max_po_map = {}
-
-        # pylint: disable=missing-docstring
-        def _max_po_below(current, has_crossed_red):
-            linked = self._tree[current]
-            neighbors = [n for n in linked]
-
-            max_po = self.po_map[current]
-            for nbor in neighbors:
-                if linked[nbor] == 'green':
-                    max_po = max(max_po, _max_po_below(nbor, has_crossed_red))
-                elif linked[nbor] == 'red' and not has_crossed_red:
-                    max_po = max(max_po, _max_po_below(nbor, 1))
-
-            # the same node may be visited more than once because
-            # through different paths because of red links, so
-            # need to do this
-            if current in _max_po_map:
-                _max_po_map[current] = max(_max_po_map[current], max_po)
-            else:
-                _max_po_map[current] = max_po
-            return max_po
-
-        _max_po_below(self.root, 0)
-        self._max_po_map = _max_po_map
-        return _max_po_map
+        if self._max_po_map is None:
+            self._compute_maps()
+        return self._max_po_map
 
     @property
     def min_po_map(self):
@@ -414,35 +1753,58 @@ class RSTree:
         Meaning, any rode reachable through tree edges and at most one
         non-tree edge.
         """
-        if self._min_po_map is not None:
-            return self._min_po_map
+        if self._min_po_map is None:
+            self._compute_maps()
+        return self._min_po_map
 
-        _min_po_map = {}
+    def _compute_maps(self):
+        """
+        Compute po_map, desc_map, max_po_map and min_po_map in O(V+E).
 
-        # pylint: disable=missing-docstring
-        def _min_po_below(current, has_crossed_red):
-            linked = self._tree[current]
-            neighbors = [n for n in linked]
-
-            min_po = self.po_map[current]
-            for nbor in neighbors:
-                if linked[nbor] == 'green':
-                    min_po = min(min_po, _min_po_below(nbor, has_crossed_red))
-                elif linked[nbor] == 'red' and not has_crossed_red:
-                    min_po = min(min_po, _min_po_below(nbor, 1))
-
-            # the same node may be visited more than once because
-            # through different paths because of red links, so
-            # need to do this
-            if current in _min_po_map:
-                _min_po_map[current] = min(_min_po_map[current], min_po)
+        An iterative depth-first pass over the tree links gives the
+        post-order ranks and descendant counts. A second pass, in post-order,
+        folds in the ranks reachable through one red link: the subtree of
+        a node x spans the ranks po[x]-desc[x]+1 .. po[x].
+        """
+        tree = self._tree
+        po_map = {}
+        desc_map = {self.root: 1}
+        post_order = []
+
+        stack = [(self.root, iter(tree[self.root].items()))]
+        while stack:
+            current, links = stack[-1]
+            for nbor, color in links:
+                if color == 'green':
+                    desc_map[nbor] = 1
+                    stack.append((nbor, iter(tree[nbor].items())))
+                    break
             else:
-                _min_po_map[current] = min_po
-            return min_po
-
-        _min_po_below(self.root, 0)
-        self._min_po_map = _min_po_map
-        return _min_po_map
+                stack.pop()
+                post_order.append(current)
+                po_map[current] = len(post_order)
+                if stack:
+                    desc_map[stack[-1][0]] += desc_map[current]
+
+        max_po_map = {}
+        min_po_map = {}
+        for current in post_order:
+            max_po = po_map[current]
+            min_po = po_map[current] - desc_map[current] + 1
+            for nbor, color in tree[current].items():
+                if color == 'green':
+                    max_po = max(max_po, max_po_map[nbor])
+                    min_po = min(min_po, min_po_map[nbor])
+                else:
+                    max_po = max(max_po, po_map[nbor])
+                    min_po = min(min_po, po_map[nbor] - desc_map[nbor] + 1)
+            max_po_map[current] = max_po
+            min_po_map[current] = min_po
+
+        self._po_map = po_map
+        self._desc_map = desc_map
+        self._max_po_map = max_po_map
+        self._min_po_map = min_po_map
 
     @property
     def bridge_links(self):
@@ -452,28 +1814,231 @@ class RSTree:
         A link is a bridge link if it is the only link
         connecting two components of the network.
         """
-        if self._bridge_links is not None:
-            return self._bridge_links
+        return [(parent, child) for child, parent in self._find_bridges().items()]
+
+    def _find_bridges(self):
+        """Return {child: parent} for the tree links that are bridges."""
+        if self._bridges is None:
+            self._bridges = {}
+            for node in self._tree:
+                for nbor in self._tree[node]:
+                    if self._is_bridge_link(node, nbor):
+                        self._bridges[nbor] = node
+        return self._bridges
+
+    def _is_bridge_link(self, node1, node2):
+        if not self._tree[node1][node2] == 'green':
+            return False
+        if not self.max_po_map[node2] <= self.po_map[node2]:
+            return False
+        if not self.min_po_map[node2] > (self.po_map[node2] - self.desc_map[node2]):
+            return False
+        return True
+
+    def _reset_maps(self):
+        self._po_map = None
+        self._desc_map = None
+        self._max_po_map = None
+        self._min_po_map = None
+
+    def add_link(self, node1, node2):
+        """
+        Update the tree for a new link between node1 and node2.
 
-        _bridge_links = []
+        A link inside the tree's component becomes a red link, and the tree
+        links on the path between its ends stop being bridges. Return False
+        if the tree must be rebuilt instead (the link joins a new component
+        to the tree).
+        """
+        tree = self._tree
+        if node1 not in tree and node2 not in tree:
+            return True
+        if node1 not in tree or node2 not in tree:
+            return False
+        if node1 == node2:
+            return True
 
-        # pylint: disable=missing-docstring
-        def _is_bridge_link(node1, node2):
-            if not self._tree[node1][node2] == 'green':
-                return False
-            if not self.max_po_map[node2] <= self.po_map[node2]:
-                return False
-            if not self.min_po_map[node2] > (self.po_map[node2] - self.desc_map[node2]):
-                return False
+        tree[node1][node2] = 'red'
+        tree[node2][node1] = 'red'
+        self._reset_maps()
+
+        if self._bridges is not None:
+            parent_of = self._parent
+            depth_of = self._depth
+            while node1 != node2:
+                if depth_of[node1] < depth_of[node2]:
+                    node1, node2 = node2, node1
+                self._bridges.pop(node1, None)
+                node1 = parent_of[node1]
+        return True
+
+    def del_link(self, node1, node2):
+        """
+        Update the tree for the deleted link between node1 and node2.
+
+        Deleting a red link keeps the tree; deleting a bridge cuts off the
+        subtree below it. Return False if the tree must be rebuilt instead
+        (a tree link that is not a bridge was deleted).
+        """
+        tree = self._tree
+        if node1 not in tree:
             return True
 
-        for node in self._tree:
-            for nbor in self._tree[node]:
-                if _is_bridge_link(node, nbor):
-                    _bridge_links.append((node, nbor))
+        if self._parent.get(node1) == node2:
+            node1, node2 = node2, node1
+        if node2 not in tree[node1]:
+            return True
+
+        if tree[node1][node2] == 'red':
+            del tree[node1][node2]
+            del tree[node2][node1]
+            self._reset_maps()
+            self._bridges = None
+            return True
 
-        self._bridge_links = _bridge_links
-        return _bridge_links
+        if self._find_bridges().get(node2) != node1:
+            return False
+
+        del tree[node1][node2]
+        del self._parent[node2]
+        cut_off = [node2]
+        for node in cut_off:
+            cut_off.extend(nbor for nbor, color in tree[node].items() if color == 'green')
+        for node in cut_off:
+            del tree[node]
+            del self._depth[node]
+            self._parent.pop(node, None)
+            self._bridges.pop(node, None)
+        self._reset_maps()
+        return True
+
+    def del_node(self, node):
+        """
+        Update the tree for a deleted node.
+
+        Return False if the tree must be rebuilt (the node was in the tree).
+        """
+        return node not in self._tree
+
+
+class BottleneckTree:
+    """
+    Lowest-peak (minimax) path queries, answered on a minimum spanning tree.
+
+    The path between two nodes minimizing the weight of its heaviest link
+    can always be taken along a minimum spanning tree, so the lowest peak
+    between two nodes is the heaviest link on their tree path. Ancestor
+    and heaviest-link tables for 1, 2, 4, ... levels up (binary lifting)
+    answer a single query in O(log V), after O(V log V) preprocessing.
+
+    Methods
+    peak -- lowest peak between two nodes
+    map_peaks_to_node -- lowest peaks from every reachable node to a node
+    map_peaks -- matrix of lowest peaks between all nodes
+
+    Properties
+    tree -- the minimum spanning tree, as a Network
+    """
+    def __init__(self, network):
+        """Build the query tables from a Network or CompiledNetwork."""
+        self.tree = network.minimum_spanning_tree()
+        self._nodes = network.nodes
+        self._index = {node: i for i, node in enumerate(self._nodes)}
+        n = len(self._nodes)
+        index = self._index
+
+        parent = list(range(n))
+        peak_to_parent = [float('-inf')] * n
+        depth_of = [0] * n
+        component = [-1] * n
+        for root in range(n):
+            if component[root] >= 0:
+                continue
+            for node, depth, up_node in self.tree.traverse(self._nodes[root]):
+                i = index[node]
+                component[i] = root
+                depth_of[i] = depth
+                if up_node is not None:
+                    parent[i] = index[up_node]
+                    peak_to_parent[i] = self.tree.link_weight(node, up_node)
+
+        self._depth = depth_of
+        self._component = component
+        self._up = [parent]
+        self._peak_up = [peak_to_parent]
+        for _ in range(max(depth_of, default=0).bit_length() - 1):
+            up = self._up[-1]
+            peak_up = self._peak_up[-1]
+            self._up.append([up[up[i]] for i in range(n)])
+            self._peak_up.append([max(peak_up[i], peak_up[up[i]]) for i in range(n)])
+
+    def peak(self, node1, node2):
+        """
+        Return the lowest peak (heaviest link weight) over paths from node1 to node2.
+
+        Return 0 if node1 is node2, float('inf') if there is no path.
+        """
+        i = self._index[node1]
+        j = self._index[node2]
+        if self._component[i] != self._component[j]:
+            return float('inf')
+        if i == j:
+            return 0
+
+        up = self._up
+        peak_up = self._peak_up
+        peak = float('-inf')
+        if self._depth[i] < self._depth[j]:
+            i, j = j, i
+
+        diff = self._depth[i] - self._depth[j]
+        level = 0
+        while diff:
+            if diff & 1:
+                peak = max(peak, peak_up[level][i])
+                i = up[level][i]
+            diff >>= 1
+            level += 1
+        if i == j:
+            return peak
+
+        for level in reversed(range(len(up))):
+            if up[level][i] != up[level][j]:
+                peak = max(peak, peak_up[level][i], peak_up[level][j])
+                i = up[level][i]
+                j = up[level][j]
+        return max(peak, peak_up[0][i], peak_up[0][j])
+
+    def map_peaks_to_node(self, node):
+        """
+        Map the lowest peak between node and every reachable node, in O(V).
+
+        Same values as Network.map_lowest_peak_to_node, without the hop counts.
+        """
+        peaks = {}
+        for current, _, parent in self.tree.traverse(node):
+            if parent is None:
+                peaks[current] = 0
+            else:
+                peaks[current] = max(peaks[parent], self.tree.link_weight(current, parent))
+        return peaks
+
+    def map_peaks(self):
+        """
+        Return the lowest peaks between all pairs of nodes, in O(V^2).
+
+        The result is a list of array('d') rows, indexed like network.nodes,
+        with float('inf') for unreachable pairs.
+        """
+        n = len(self._nodes)
+        index = self._index
+        matrix = []
+        for node in self._nodes:
+            row = array('d', [float('inf')]) * n
+            for other, peak in self.map_peaks_to_node(node).items():
+                row[index[other]] = peak
+            matrix.append(row)
+        return matrix
 
 
 def test():
@@ -498,23 +2063,266 @@ def test():
 
     assert test_net.node_count == 7
     assert test_net.link_count == 9
+    assert Network(from_dict={1: {2: 1}, 2: {1: 1}}).link_count == 1
+    self_link_net = Network.from_edges([(1, 1), (1, 2)])
+    assert self_link_net.link_count == self_link_net.compile().link_count == 2
     assert set(test_net.find_neighbors('a')) == set(['b', 'd'])
     assert test_net.link_weight('a', 'b') == 10
     assert 'g' in test_net.nodes
     assert test_net.compute_node_centrality('a') == 13/7
     assert test_net.compute_node_cc('a') == 1
+    assert test_net.triangle_count() == {'a': 1, 'b': 2, 'c': 1, 'd': 2, 'e': 0, 'f': 0, 'g': 0}
+    cc_map = test_net.map_cc()
+    assert all(cc_map[node] == test_net.compute_node_cc(node) for node in test_net.nodes)
+    assert test_net.average_cc() == sum(cc_map.values())/7
+    assert test_net.transitivity() == 6/17
+    self_links = Network.from_edges([('a', 'b'), ('a', 'c'), ('a', 'd'), ('b', 'b'), ('c', 'c'),
+                                     ('c', 'd')])
+    self_links.add_link('d', 'd')
+    self_links.add_link('a', 'a')
+    self_cc_map = self_links.map_cc()
+    assert self_links.compute_node_cc('a') == 1/3
+    assert self_links.compute_node_cc('b') == 0
+    for node in self_links.nodes:
+        assert self_links.compute_node_cc(node) == self_cc_map[node]
+        assert self_links.compile().compute_node_cc(node) == self_cc_map[node]
+    assert test_net.estimate_node_cc('a') == (1.0, (1.0, 1.0))
+    cc, (low, high) = test_net.estimate_cc(seed=1)
+    assert low <= test_net.average_cc() <= high
+    ac_estimates = test_net.estimate_ac(samples=200, seed=1)
+    assert all(low <= test_net.compute_node_centrality(node) <= high
+               for node, (_, (low, high)) in ac_estimates.items())
+    # Sampled and exact components get their own distance ranges
+    chain = Network.from_edges([(i, i+1) for i in range(299)] + [('x', 'y')])
+    chain_estimates = chain.estimate_ac(samples=50, seed=105)
+    assert chain_estimates['x'] == (0.5, (0.5, 0.5))
+    for node in (0, 150, 299):
+        estimate, (low, high) = chain_estimates[node]
+        assert low <= estimate <= high <= 2 * 299
+        assert low <= chain.compute_node_centrality(node) <= high
+    assert chain.estimate_ac(nodes=[0, 1], samples=50) == {
+        node: (ac, (ac, ac)) for node, ac in chain.map_ac(nodes=[0, 1]).items()}
+    for estimate in (lambda: test_net.estimate_node_cc('a', samples=0),
+                     lambda: test_net.estimate_cc(samples=0),
+                     lambda: test_net.estimate_ac(samples=0)):
+        try:
+            estimate()
+            assert False
+        except ValueError:
+            pass
     dist_map = test_net.map_distance_to_node('a')
     assert dist_map['f'] == 2
+    assert [n for n, _, _ in test_net.traverse('a')][0] == 'a'
+    assert ('g', 4, 'e') in list(test_net.traverse('a'))
+    test_net.add_node('h')
+    assert sorted(map(sorted, test_net.connected_components())) == [
+        ['a', 'b', 'c', 'd', 'e', 'f', 'g'], ['h']]
+    test_net.del_node('h')
     dist_wt_map = test_net.map_weighted_distance_to_node('a')
     assert dist_wt_map['f'] == (8, 5)
     dist_peak_map = test_net.map_lowest_peak_to_node('a')
     assert dist_peak_map['f'] == (4, 5)
+    assert test_net.shortest_path('a', 'f') == (['a', 'b', 'f'], 2)
+    assert test_net.shortest_path('a', 'f', weighted=True) == (['a', 'd', 'b', 'c', 'e', 'f'], 8)
+    assert test_net.shortest_path('a', 'f', heuristic=lambda n1, n2: 0) == (
+        ['a', 'd', 'b', 'c', 'e', 'f'], 8)
+    assert test_net.shortest_path('g', 'g') == (['g'], 0)
+    # Admissible but not consistent: x is first reached through the long link
+    inconsistent = Network.from_edges(
+        [('s', 'a', 1), ('a', 'x', 1), ('s', 'x', 3), ('x', 't', 5)], weighted=True)
+    h_values = {'s': 0, 'a': 4, 'x': 0, 't': 0}
+    assert inconsistent.shortest_path('s', 't', heuristic=lambda n1, n2: h_values[n1]) == (
+        ['s', 'a', 'x', 't'], 7)
+    mst = test_net.minimum_spanning_tree()
+    assert mst.node_count == 7 and mst.link_count == 6
+    assert sum(mst.link_weight(*link) for link in [('a', 'd'), ('b', 'd'), ('b', 'c'),
+                                                   ('c', 'e'), ('e', 'f'), ('e', 'g')]) == 9
+    b_tree = BottleneckTree(test_net)
+    for node in test_net.nodes:
+        peaks = {n: peak for n, (peak, _) in test_net.map_lowest_peak_to_node(node).items()}
+        assert b_tree.map_peaks_to_node(node) == peaks
+        assert all(b_tree.peak(node, other) == peaks[other] for other in peaks)
     assert test_net.bridge_links == [('e', 'g')] or test_net.bridge_links == [('g', 'e')]
+    chain = Network()
+    for i in range(9999):
+        chain.add_link(i, i+1)
+    assert len(chain.bridge_links) == 9999
+    chain.add_link(0, 9999)
+    assert chain.bridge_links == []
     ac_map = test_net.map_ac()
     assert ac_map['a'] == 13/7
     ac_map2 = test_net.map_ac2()
     assert ac_map2['a'] == 13/7
-    
+
+
+def test_from_edges():
+    import os
+    import tempfile
+
+    edges = [('a', 'b', 10), ('a', 'd', 1), ('b', 'c', 1), ('b', 'd', 4)]
+    test_net = Network.from_edges(edges, weighted=True)
+    assert test_net.link_count == 4
+    assert test_net.link_weight('d', 'b') == 4
+    assert Network.from_edges([(1, 2), (2, 3)]).link_weight(3, 2) == 1
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, 'edges.csv')
+        gz_path = os.path.join(tmpdir, 'edges.txt.gz')
+        with open(csv_path, 'w') as csv_file:
+            csv_file.write('# node1,node2,weight\n')
+            csv_file.writelines('{},{},{}\n'.format(*edge) for edge in edges)
+        with gzip.open(gz_path, 'wt') as gz_file:
+            gz_file.write('1 2\n\n2  3\n')
+
+        file_net = Network.from_edge_file(csv_path, delim=',', weighted=True)
+        assert file_net.link_weight('a', 'b') == 10.0
+        assert file_net.link_count == 4
+        gz_net = Network.from_edge_file([gz_path], node_type=int)
+        assert gz_net.nodes == [1, 2, 3] and gz_net.link_count == 2
+
+        bin_path = os.path.join(tmpdir, 'edges.jbnet')
+        test_net.save(bin_path)
+        for use_mmap in (True, False):
+            loaded = Network.load(bin_path, mmap=use_mmap)
+            assert loaded.nodes == test_net.nodes
+            assert loaded.link_count == 4
+            assert loaded.map_weighted_distance_to_node('a') == test_net.map_weighted_distance_to_node('a')
+            assert pickle.loads(pickle.dumps(loaded)).map_ac() == test_net.map_ac()
+        del loaded
+
+
+def test_distance_cache():
+    test_net = Network(cache_size=10)
+    for i in range(4):
+        test_net.add_link(i, i+1, weight=2)
+
+    assert test_net.map_distance_to_node(0)[4] == 4
+    assert test_net.map_distance_to_node(0)[4] == 4
+    assert test_net.map_weighted_distance_to_node(0)[4] == (8, 4)
+    info = test_net.cache_info()
+    assert (info['hits'], info['misses'], info['entries']) == (1, 2, 10)
+    test_net.map_weighted_distance_to_node(0, queue='pairing')
+    assert test_net.cache_info()['misses'] == 3
+
+    test_net.map_distance_to_node(0)[4] = 'changed'
+    assert test_net.map_distance_to_node(0)[4] == 4
+
+    test_net.add_link(0, 4)
+    assert test_net.map_distance_to_node(0)[4] == 1
+    test_net.del_node(2)
+    assert test_net.link_count == 3
+    assert 2 not in test_net.map_distance_to_node(0)
+    assert test_net.map_lowest_peak_to_node(3)[0] == (2, 2)
+    assert test_net.cache_info()['entries'] <= 10
+
+    test_net.add_links([(5, 6), (6, 7, 3)])
+    assert test_net.link_weight(6, 7) == 3
+    assert test_net.link_count == 5
+    test_net.prune_network([0, 1, 3, 4, 5])
+    assert test_net.link_count == 3
+    test_net.del_nodes([0, 1])
+    assert test_net.nodes == [3, 4, 5] and test_net.link_count == 1
+
+
+def test_bridge_updates():
+    random.seed(0)
+    test_net = Network()
+    for i in range(60):
+        test_net.add_link(i, (i+1) % 60)
+
+    for _ in range(300):
+        node1 = random.choice(test_net.nodes)
+        node2 = random.choice(test_net.nodes)
+        roll = random.random()
+        if roll < 0.4 and node1 != node2:
+            test_net.add_link(node1, node2)
+        elif roll < 0.8 and test_net.find_neighbors(node1):
+            test_net.del_link(node1, random.choice(test_net.find_neighbors(node1)))
+        elif roll < 0.85 and node1 != test_net.nodes[0]:
+            test_net.del_node(node1)
+            test_net.add_node(node1)
+        bridges = set(map(frozenset, test_net.bridge_links))
+        expected = set(map(frozenset, RSTree(test_net, test_net.nodes[0]).bridge_links))
+        assert bridges == expected
+
+
+def test_compiled():
+    edges = [
+        ('a', 'b', 10),
+        ('a', 'd', 1),
+        ('b', 'c', 1),
+        ('b', 'd', 4),
+        ('b', 'f', 5),
+        ('c', 'd', 20),
+        ('c', 'e', 1),
+        ('e', 'f', 1),
+        ('e', 'g', 1)]
+
+    test_net = Network()
+
+    for edge in edges:
+        test_net.add_link(edge[0], edge[1], weight=edge[2])
+
+    compiled = test_net.compile()
+
+    assert compiled.node_count == 7
+    assert compiled.link_count == 9
+    assert set(compiled.find_neighbors('a')) == set(['b', 'd'])
+    assert compiled.link_weight('a', 'b') == 10
+    for node in test_net.nodes:
+        assert compiled.map_distance_to_node(node) == test_net.map_distance_to_node(node)
+        assert compiled.compute_node_centrality(node) == test_net.compute_node_centrality(node)
+        assert compiled.compute_node_cc(node) == test_net.compute_node_cc(node)
+        assert compiled.map_weighted_distance_to_node(node) == test_net.map_weighted_distance_to_node(node)
+        assert compiled.map_lowest_peak_to_node(node) == test_net.map_lowest_peak_to_node(node)
+    assert compiled.bridge_links == [('e', 'g')] or compiled.bridge_links == [('g', 'e')]
+    assert compiled.map_ac() == test_net.map_ac()
+    assert compiled.triangle_count() == test_net.triangle_count()
+    assert compiled.map_cc() == test_net.map_cc()
+    assert compiled.transitivity() == test_net.transitivity()
+    assert test_net.map_ac(workers=2) == test_net.map_ac()
+    acmap = compiled.map_ac()
+    assert test_net.map_ac(nodes=['a', 'g']) == {'a': acmap['a'], 'g': acmap['g']}
+    chains = Network.from_edges([(i, i+1) for i in range(0, 200)] +
+                                [(i, i+1) for i in range(300, 400)])
+    chain_acmap = chains.compile().map_ac()
+    assert chains.map_ac(nodes=range(100)) == {i: chain_acmap[i] for i in range(100)}
+    for node in test_net.nodes:
+        assert ({n: d for n, d, _ in compiled.traverse(node)} ==
+                {n: d for n, d, _ in test_net.traverse(node)})
+    assert [sorted(c) for c in compiled.connected_components()] == [sorted(test_net.nodes)]
+    for lowest_peak in (False, True):
+        nodes, fw_matrix = compiled.map_weighted_distances(lowest_peak, method='floyd-warshall')
+        _, dj_matrix = test_net.map_weighted_distances(lowest_peak, method='djikstra')
+        _, auto_matrix = test_net.map_weighted_distances(lowest_peak)
+        assert fw_matrix == dj_matrix == auto_matrix
+    i_a = nodes.index('a')
+    assert fw_matrix[i_a][nodes.index('f')] == 4
+    assert dj_matrix[i_a][i_a] == 0
+    for queue in ('d-ary', 'pairing'):
+        for node in test_net.nodes:
+            dist_map = compiled.map_weighted_distance_to_node(node, queue=queue)
+            assert ({n: d for n, (d, _) in dist_map.items()} ==
+                    {n: d for n, (d, _) in test_net.map_weighted_distance_to_node(node).items()})
+            assert (test_net.map_lowest_peak_to_node(node, queue=queue) ==
+                    compiled.map_lowest_peak_to_node(node, queue=queue))
+        assert compiled.map_weighted_distances(True, method='djikstra', queue=queue)[1] == dj_matrix
+    negative = Network.from_edges([('a', 'b', -1), ('b', 'c', 2)], weighted=True)
+    for method in ('auto', 'floyd-warshall', 'djikstra'):
+        try:
+            negative.map_weighted_distances(method=method)
+            assert False
+        except ValueError:
+            pass
+    assert negative.map_weighted_distances(lowest_peak=True)[1][0][2] == 2
+    dist_maps = test_net.map_distances_from(test_net.nodes, batch_size=3)
+    for node in test_net.nodes:
+        assert dist_maps[node] == test_net.map_distance_to_node(node)
+
 
 if __name__ == '__main__':
-    test()
\ No newline at end of file
+    test()
+    test_from_edges()
+    test_distance_cache()
+    test_bridge_updates()
+    test_compiled()
\ No newline at end of file
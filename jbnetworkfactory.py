@@ -10,6 +10,9 @@ build_clique_network
 build_hypercube_network
 build_grid_network
 """
+import math
+import random
+
 import jbnetwork as jbn
 
 def build_star_network(size):
@@ -66,23 +69,23 @@ def build_hypercube_network(size):
             return {0:{}}
 
         network = {}
-        network1 = _rec_build_hc_net(size/2)
+        network1 = _rec_build_hc_net(size//2)
 
         for node1 in network1:
             network[node1] = network1[node1]
-            network[node1 + size/2] = {}
+            network[node1 + size//2] = {}
             for node2 in network1[node1]:
-                network[node1 + size/2][node2 + size/2] = 1
+                network[node1 + size//2][node2 + size//2] = 1
 
-            network[node1][node1 + size/2] = 1
-            network[node1 + size/2][node1] = 1
+            network[node1][node1 + size//2] = 1
+            network[node1 + size//2][node1] = 1
         return network
 
     # Find largest power of 2 <= size
     pow2size = 2**int(math.log(size, 2))
 
     network = _rec_build_hc_net(pow2size)
-    return Network(from_dict=network)
+    return jbn.Network(from_dict=network)
 
 
 def build_grid_network(dim):
@@ -92,9 +95,9 @@ def build_grid_network(dim):
     dim -- (x, y) tuple of dimensions
     """
     network = jbn.Network()
-    for node in range(size[0] * size[1]):
-        if (node+1) % size[0] != 0:
+    for node in range(dim[0] * dim[1]):
+        if (node+1) % dim[0] != 0:
             network.add_link(node, node+1)
-        if node < (size[1] - 1)*size[0]:
-            network.add_link(node, node+size[0])
+        if node < (dim[1] - 1)*dim[0]:
+            network.add_link(node, node+dim[0])
     return network
\ No newline at end of file
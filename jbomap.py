@@ -1,5 +1,70 @@
 """OrderedMap class: A mutable ordered sequence with optional labels."""
-from jbheap import KeyValueHeap
+from itertools import islice
+import random
+
+
+class _Node(object):
+	"""Treap node: value, label, random priority, subtree size, and links."""
+	__slots__ = ('val', 'label', 'prio', 'size', 'left', 'right', 'parent')
+
+	def __init__(self, val, label):
+		self.val = val
+		self.label = label
+		self.prio = random.random()
+		self.size = 1
+		self.left = None
+		self.right = None
+		self.parent = None
+
+
+def _size(node):
+	return node.size if node is not None else 0
+
+
+def _update(node):
+	node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _merge(left, right):
+	"""Join two treaps, all of left before all of right."""
+	if left is None:
+		return right
+	if right is None:
+		return left
+	if left.prio > right.prio:
+		left.right = _merge(left.right, right)
+		left.right.parent = left
+		_update(left)
+		return left
+	else:
+		right.left = _merge(left, right.left)
+		right.left.parent = right
+		_update(right)
+		return right
+
+
+def _split(node, k):
+	"""Split a treap into its first k nodes and the rest."""
+	if node is None:
+		return (None, None)
+	if _size(node.left) >= k:
+		left, right = _split(node.left, k)
+		node.left = right
+		if right is not None:
+			right.parent = node
+		if left is not None:
+			left.parent = None
+		_update(node)
+		return (left, node)
+	else:
+		left, right = _split(node.right, k - _size(node.left) - 1)
+		node.right = left
+		if left is not None:
+			left.parent = node
+		if right is not None:
+			right.parent = None
+		_update(node)
+		return (node, right)
 
 
 class OrderedMap(object):
@@ -10,6 +75,12 @@ class OrderedMap(object):
 	by label will not work, since omap[i] where i is an int
 	accesses by (positional) index.
 
+	Values are kept in an implicit treap (a randomized balanced
+	tree ordered by position), with a parent pointer in each node,
+	and labels in a dict of label -> node. Lookup by label is O(1);
+	insert, remove and lookup by position, and finding the position
+	of a label, are O(log n).
+
 	Methods
 		append
 		insert
@@ -17,6 +88,8 @@ class OrderedMap(object):
 		remove_by_label
 		index
 		index_by_label
+		position
+		items
 
 	Supported operators
 		+ (concatenates)
@@ -24,7 +97,7 @@ class OrderedMap(object):
 		Slice indexing with [:]
 
 	 Usage
-	 	omap = OMap({(0, 'foo'):'bar', (1, 'baz'):'banana'})
+		omap = OrderedMap({(0, 'foo'):'bar', (1, 'baz'):'banana'})
 		omap[0]
 		 > 'bar'
 		omap['foo']
@@ -35,44 +108,204 @@ class OrderedMap(object):
 
 	"""
 	def __init__(self, map=None):
-		self.omap = []
-		self.lmap = KeyValueHeap()
+		self._root = None
+		self.lmap = {}
 
 		if map is not None:
 			for key in map:
 				try:
-					self.insert(key[0], key[1], map[key])
+					self.insert(key[0], map[key], key[1])
 				except IndexError:
-					self.insert(key[0], None, map[key])
+					self.insert(key[0], map[key], None)
 
 	def __add__(self, operand2):
-		pass
+		result = OrderedMap()
+		for label, val in self.items():
+			result.append(val, label)
+		for label, val in operand2.items():
+			result.append(val, label)
+		return result
 
 	def __len__(self):
-		pass
+		return _size(self._root)
 
 	def __iter__(self):
-		pass
+		for node in self._iter_nodes(0):
+			yield node.val
+
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			result = OrderedMap()
+			for node in self._slice_nodes(key):
+				result.append(node.val, node.label)
+			return result
+		elif isinstance(key, int):
+			return self.index(key)
+		else:
+			return self.index_by_label(key)
+
+	def __setitem__(self, key, val):
+		"""Set the value at a position, or of a label (appended if new)."""
+		if isinstance(key, int):
+			self._node_at(key).val = val
+		elif key in self.lmap:
+			self.lmap[key].val = val
+		else:
+			self.append(val, key)
+
+	def items(self):
+		"""Iterate over (label, value) pairs, in order."""
+		for node in self._iter_nodes(0):
+			yield (node.label, node.val)
 
 	def append(self, val, label=None):
-		pass
+		self.insert(len(self), val, label)
 
 	def insert(self, ii, val, label=None):
-		if not hash(label) in self.lmap.keys():
-			self.omap.insert(ii, (val, label))
-			if label is not None:
-				self.lmap.insert((hash(label), val))
-		else:
+		"""Insert val before position ii, as list.insert."""
+		if label in self.lmap:
 			raise AttributeError('Label already exists.')
+		if ii < 0:
+			ii = max(0, ii + len(self))
+		node = _Node(val, label)
+		left, right = _split(self._root, ii)
+		self._root = _merge(_merge(left, node), right)
+		self._root.parent = None
+		if label is not None:
+			self.lmap[label] = node
 
 	def remove(self, ii):
-		pass
-	
+		"""Remove the value at position ii and return it."""
+		ii = self._normalize(ii)
+		left, right = _split(self._root, ii)
+		node, right = _split(right, 1)
+		self._root = _merge(left, right)
+		if self._root is not None:
+			self._root.parent = None
+		if node.label is not None:
+			del self.lmap[node.label]
+		return node.val
+
 	def remove_by_label(self, label):
-		pass
+		"""Remove the value with label and return it."""
+		return self.remove(self.position(label))
 
 	def index(self, ii):
-		pass
+		"""Return the value at position ii."""
+		return self._node_at(ii).val
 
 	def index_by_label(self, label):
+		"""Return the value with label."""
+		return self.lmap[label].val
+
+	def position(self, label):
+		"""Return the position of the value with label."""
+		node = self.lmap[label]
+		pos = _size(node.left)
+		while node.parent is not None:
+			if node is node.parent.right:
+				pos += _size(node.parent.left) + 1
+			node = node.parent
+		return pos
+
+	def _normalize(self, ii):
+		n = len(self)
+		if ii < 0:
+			ii += n
+		if not 0 <= ii < n:
+			raise IndexError('OrderedMap index out of range')
+		return ii
+
+	def _node_at(self, ii):
+		ii = self._normalize(ii)
+		node = self._root
+		while True:
+			left_size = _size(node.left)
+			if ii < left_size:
+				node = node.left
+			elif ii == left_size:
+				return node
+			else:
+				ii -= left_size + 1
+				node = node.right
+
+	def _iter_nodes(self, start):
+		"""Iterate over the nodes in order, from position start."""
+		if start >= len(self):
+			return
+		node = self._node_at(start)
+		while node is not None:
+			yield node
+			# In-order successor
+			if node.right is not None:
+				node = node.right
+				while node.left is not None:
+					node = node.left
+			else:
+				while node.parent is not None and node is node.parent.right:
+					node = node.parent
+				node = node.parent
+
+	def _slice_nodes(self, key):
+		positions = range(len(self))[key]
+		if len(positions) == 0:
+			return []
+		if positions.step > 0:
+			nodes = self._iter_nodes(positions.start)
+			return islice(nodes, 0, positions.stop - positions.start, positions.step)
+		return [self._node_at(ii) for ii in positions]
+
+
+def test():
+	omap = OrderedMap({(0, 'foo'): 'bar', (1, 'baz'): 'banana'})
+	assert omap[0] == 'bar' and omap['foo'] == 'bar'
+	omap[1] = 'apple'
+	assert omap['baz'] == 'apple'
+	try:
+		omap.append('x', 'foo')
+		assert False
+	except AttributeError:
+		pass
+
+	model = []
+	omap = OrderedMap()
+	for i in range(3000):
+		action = random.random()
+		if action < 0.6 or len(model) == 0:
+			ii = random.randint(-len(model) - 1, len(model))
+			label = 'l{}'.format(i) if i % 2 else None
+			omap.insert(ii, i, label)
+			model.insert(ii, (label, i))
+		elif action < 0.8:
+			ii = random.randrange(-len(model), len(model))
+			assert omap.remove(ii) == model.pop(ii)[1]
+		else:
+			labels = [label for label, _ in model if label is not None]
+			if labels:
+				label = random.choice(labels)
+				ii = [l for l, _ in model].index(label)
+				assert omap.position(label) == ii
+				assert omap.remove_by_label(label) == model.pop(ii)[1]
+
+	assert len(omap) == len(model)
+	assert list(omap) == [val for _, val in model]
+	assert list(omap.items()) == model
+	for ii in (0, len(model) // 2, -1):
+		assert omap[ii] == model[ii][1]
+	for key in (slice(3, 50), slice(None, None, 7), slice(40, 2, -3), slice(5, 5)):
+		assert list(omap[key].items()) == model[key]
+	for label, val in model[::5]:
+		if label is not None:
+			assert omap[label] == val
+
+	both = omap[:10] + omap[10:]
+	assert list(both.items()) == model
+	try:
+		omap + omap
+		assert False
+	except AttributeError:
 		pass
+
+
+if __name__ == '__main__':
+	test()